@@ -1,11 +1,15 @@
 import os
-from threading import Event, Thread
+from threading import Event, Lock, Thread
 
 from playsound import playsound
 
 path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "notification.wav")
 playing = Event()
 
+# The repeat loop is only started once a sound has to be repeated
+repeat_loop = None
+_repeat_lock = Lock()
+
 
 def _repeat():
     while True:
@@ -13,15 +17,16 @@ def _repeat():
         playsound(path)
 
 
-repeat_loop = Thread(target=_repeat, daemon=True)
-repeat_loop.start()
-
-
 def play(block=False):
     playsound(path, block)
 
 
 def start():
+    global repeat_loop
+    with _repeat_lock:
+        if repeat_loop is None:
+            repeat_loop = Thread(target=_repeat, daemon=True)
+            repeat_loop.start()
     playing.set()
 
 
@@ -0,0 +1,105 @@
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import psutil
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, f"{name}.html"), "rb") as f:
+        return f.read()
+
+
+class FixtureServer:
+    """Serves product page fixtures from a local HTTP server.
+
+    Every path returns the page of the current state, so any number of
+    URLs can point at the server.
+    """
+
+    def __init__(self, state="sold_out"):
+        self.pages = {}
+        self.set_state(state)
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(server.page)))
+                self.end_headers()
+
+            def do_GET(self):
+                page = server.page
+                self.do_HEAD()
+                self.wfile.write(page)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def url(self, sku=6429440):
+        port = self.httpd.server_address[1]
+        return f"http://127.0.0.1:{port}/site/example-product/{sku}.p?skuId={sku}"
+
+    def set_state(self, state):
+        """Switch the page that is served and return when it happened."""
+        if state not in self.pages:
+            self.pages[state] = load_fixture(state)
+        self.page = self.pages[state]
+        return time.perf_counter()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, round(percent / 100 * len(ordered)) - 1)]
+
+
+class ResourceMonitor:
+    """Measures CPU and memory used by this process and its children (e.g. browsers)."""
+
+    def __init__(self):
+        self.process = psutil.Process(os.getpid())
+        self.reset()
+
+    def _processes(self):
+        return [self.process] + self.process.children(recursive=True)
+
+    def _cpu_time(self):
+        total = 0
+        for process in self._processes():
+            try:
+                times = process.cpu_times()
+                total += times.user + times.system
+            except psutil.Error:
+                pass
+        return total
+
+    def reset(self):
+        self.start_time = time.perf_counter()
+        self.start_cpu = self._cpu_time()
+
+    def cpu_percent(self):
+        elapsed = time.perf_counter() - self.start_time
+        return 100 * (self._cpu_time() - self.start_cpu) / elapsed
+
+    def rss(self):
+        total = 0
+        for process in self._processes():
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
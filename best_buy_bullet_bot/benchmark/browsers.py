@@ -0,0 +1,173 @@
+import statistics
+import time
+
+import psutil
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from best_buy_bullet_bot.benchmark import FixtureServer, percentile
+from best_buy_bullet_bot.browser import _get_options
+from best_buy_bullet_bot.data import url_utils
+from best_buy_bullet_bot.data.setting_utils import (
+    DRIVER_NAMES,
+    is_installed,
+    update_setting,
+)
+from best_buy_bullet_bot.tracker.dom_detection import BUTTON_SELECTOR
+from best_buy_bullet_bot.utils import (
+    Colors,
+    loading,
+    print_table,
+    warnings_suppressed,
+    yes_or_no,
+)
+
+# Times each browser reloads the product page
+RELOADS = 10
+
+# Roughly how many cookies Best Buy sets once you are logged in
+NUM_COOKIES = 40
+
+# Most of the available memory the recommended browsers may use
+MEMORY_SHARE = 0.5
+
+PAGE_TIMEOUT = 30
+
+
+def _rss(driver):
+    """Memory used by a driver and the browser it controls."""
+    process = psutil.Process(driver.service.process.pid)
+    total = 0
+    for process in [process] + process.children(recursive=True):
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+
+def measure(browser_name, url, instances):
+    """Launch `instances` browsers the way the tracker does and time each stage."""
+    wrapper = DRIVER_NAMES[browser_name]
+    path = wrapper.install()
+    options = _get_options(True, browser_name)
+    button_locator = EC.presence_of_element_located((By.CSS_SELECTOR, BUTTON_SELECTOR))
+
+    launches, cookies, reloads, drivers = [], [], [], []
+    try:
+        for _ in range(instances):
+            start = time.perf_counter()
+            driver = wrapper.driver(executable_path=path, options=options)
+            launches.append(time.perf_counter() - start)
+            drivers.append(driver)
+
+            # Cookies can only be set for the page that is open
+            wait = WebDriverWait(driver, PAGE_TIMEOUT)
+            driver.get(url)
+            btn = wait.until(button_locator)
+
+            start = time.perf_counter()
+            for i in range(NUM_COOKIES):
+                driver.add_cookie({"name": f"cookie{i}", "value": "0" * 64})
+            cookies.append(time.perf_counter() - start)
+
+            for _ in range(RELOADS):
+                start = time.perf_counter()
+                driver.get(url)
+                wait.until(EC.staleness_of(btn))
+                btn = wait.until(button_locator)
+                reloads.append(time.perf_counter() - start)
+
+        # Let every browser settle before measuring how much memory it uses
+        time.sleep(2)
+        memory = [_rss(driver) for driver in drivers]
+    finally:
+        for driver in drivers:
+            driver.quit()
+
+    return launches, cookies, reloads, memory
+
+
+def recommend(results, num_urls):
+    """Pick the browser that finds the button the fastest and the most threads the machine can run with it."""
+    browser_name = min(results, key=lambda name: statistics.median(results[name][2]))
+    memory = statistics.median(results[browser_name][3])
+
+    # Each tracker thread runs its own browser
+    available = psutil.virtual_memory().available * MEMORY_SHARE
+    browsers = max(1, min(int(available // memory), psutil.cpu_count(logical=True)))
+    return browser_name, max(1, browsers // num_urls)
+
+
+def compare(trials=3):
+    """Compare how quickly each browser tracks a product page and recommend one."""
+    print(
+        f"Launching {trials} browser{'s' if trials > 1 else ''} of each kind and reloading each one {RELOADS} times.\n"
+    )
+
+    server = FixtureServer("in_stock")
+    results = {}
+    for browser_name in DRIVER_NAMES:
+        with loading(f"Detecting {browser_name.title()}"):
+            installed = is_installed(browser_name)
+        if not installed:
+            Colors.warn(f"Skipping {browser_name.title()} since it isn't installed.")
+            continue
+
+        with loading(f"Benchmarking {browser_name.title()}"):
+            try:
+                results[browser_name] = measure(browser_name, server.url(), trials)
+            except WebDriverException as e:
+                Colors.print(e, properties=["fail"])
+                Colors.print(
+                    f"Unable to benchmark {browser_name.title()}.", properties=["fail"]
+                )
+    server.close()
+
+    if not results:
+        Colors.print(
+            "No browsers could be benchmarked. Please install either Chrome or Firefox and try again.",
+            properties=["fail", "bold"],
+        )
+        return
+
+    print_table(
+        [
+            "Browser",
+            "Launch",
+            f"Set {NUM_COOKIES} cookies",
+            "Reload to button (p50/p95)",
+            "Memory per browser",
+        ],
+        [
+            [
+                browser_name.title(),
+                f"{statistics.median(launches):,.2f} s",
+                f"{statistics.median(cookies) * 1000:,.0f} ms",
+                f"{percentile(reloads, 50) * 1000:,.0f} / {percentile(reloads, 95) * 1000:,.0f} ms",
+                f"{statistics.median(memory) / 2**20:,.0f} MB",
+            ]
+            for browser_name, (launches, cookies, reloads, memory) in results.items()
+        ],
+        justifications=["left"] + ["center"] * 4,
+    )
+
+    num_urls = max(1, sum(len(url_group) for url_group, _ in url_utils.get_url_data()))
+    browser_name, threads = recommend(results, num_urls)
+    Colors.print(
+        f"\nRecommended: {browser_name.title()} with {threads} thread{'s' if threads > 1 else ''} per URL "
+        f"({num_urls} URL{'s' if num_urls > 1 else ''} tracked).",
+        properties=["blue"],
+    )
+
+    if not warnings_suppressed() and yes_or_no(
+        "Would you like to use these settings (y/n): "
+    ):
+        update_setting("browser", browser_name)
+        update_setting("threads", threads)
+        Colors.print(
+            f"Now using {browser_name.title()} with {threads} thread{'s' if threads > 1 else ''} to track each URL!",
+            properties=["success"],
+        )
@@ -0,0 +1,285 @@
+import io
+import statistics
+import time
+from contextlib import contextmanager, redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+from selenium.common.exceptions import WebDriverException
+
+from best_buy_bullet_bot import browser
+from best_buy_bullet_bot.benchmark import load_fixture
+from best_buy_bullet_bot.data.setting_utils import DRIVER_NAMES, is_installed
+from best_buy_bullet_bot.funds import FundsLedger
+from best_buy_bullet_bot.utils import Colors, loading, print_table
+
+# Every branch `_purchase` can take to get to the place order button
+FLOWS = ["fast-track", "continue to payment", "cart redirect", "password re-prompt"]
+
+# Long enough for a browser to load a local page but short enough that
+# a stand-in page that doesn't match the selectors fails quickly
+STEP_TIMEOUT = 30
+
+GRAND_TOTAL = 749.98
+
+_PAGE = """<!DOCTYPE html>
+<html lang="en-US">
+<head><meta charset="utf-8"><title>{title} - Best Buy</title></head>
+<body>
+<div class="shop-header"><a class="logo" href="/">Best Buy</a></div>
+{body}
+</body>
+</html>
+"""
+
+_SUBMIT = "btn btn-secondary btn-lg btn-block c-button-icon c-button-icon-leading cia-form__controls__submit"
+
+
+def _button(classes, text, href):
+    return f'<button class="{classes}" type="button" onclick="location.href=\'{href}\'">{text}</button>'
+
+
+def _place_order_page(cvv_id, fast_track=False):
+    return (
+        f'<label for="{cvv_id}">CVV</label><input id="{cvv_id}" class="form-control" type="text" autocomplete="off">\n'
+        '<div class="order-summary__total"><span class="order-summary__label">Total</span>'
+        f'<span class="order-summary__price"><span class="cash-money">${GRAND_TOTAL:,.2f}</span></span></div>\n'
+        + _button(
+            "btn btn-lg btn-block btn-primary"
+            + (" button__fast-track" if fast_track else ""),
+            "Place Your Order",
+            "/checkout/r/thank-you",
+        )
+    )
+
+
+# Pages that are the same for every flow
+_PAGES = {
+    "/checkout/r/payment": ("Checkout", _place_order_page("credit-card-cvv")),
+    "/checkout/r/review": ("Review Your Order", _place_order_page("cvv")),
+    "/checkout/r/continue": (
+        "Checkout",
+        '<div class="button--continue">'
+        + _button(
+            "btn btn-lg btn-block btn-secondary",
+            "Continue to Payment Information",
+            "/checkout/r/payment",
+        )
+        + "</div>",
+    ),
+    "/identity/signin": (
+        "Sign In",
+        '<input id="fld-p1" class="tb-input" type="password" autocomplete="off">\n'
+        + _button(_SUBMIT, "Sign In", "/checkout/r/payment"),
+    ),
+    "/checkout/r/thank-you": ("Thank You", "<h1>Thank you for your order.</h1>"),
+}
+
+
+class CheckoutSite:
+    """A local stand-in for the parts of Best Buy that checkout goes through.
+
+    The fast-track checkout page sends the browser down a different branch
+    of `_purchase` depending on the flow that is set. Every other path
+    serves the in stock product page. Nothing is ever ordered.
+    """
+
+    def __init__(self, flow=FLOWS[0]):
+        self.flow = flow
+        self.product_page = load_fixture("in_stock")
+
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, status, page=b"", location=None):
+                self.send_response(status)
+                if location is not None:
+                    self.send_header("Location", location)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                location = site.redirect(path)
+                if location is None:
+                    self._send(200, site.page(path))
+                else:
+                    self._send(302, location=location)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def product_url(self, sku=6429440):
+        return f"{self.base_url}/site/example-product/{sku}.p?skuId={sku}"
+
+    def redirect(self, path):
+        """Where the browser is sent instead of the path (None if it isn't redirected)."""
+        if path == "/checkout/r/fast-track" and self.flow != FLOWS[0]:
+            return "/checkout/r/continue" if self.flow == FLOWS[1] else "/cart"
+
+    def page(self, path):
+        if path == "/checkout/r/fast-track":
+            title, body = "Checkout", _place_order_page("credit-card-cvv", True)
+        elif path == "/cart":
+            # The password is only asked for after leaving the cart
+            next_page = (
+                "/identity/signin" if self.flow == FLOWS[3] else "/checkout/r/review"
+            )
+            title, body = (
+                "Cart",
+                '<div class="checkout-buttons__checkout">'
+                + _button("btn btn-lg btn-block btn-primary", "Checkout", next_page)
+                + "</div>",
+            )
+        elif path in _PAGES:
+            title, body = _PAGES[path]
+        else:
+            return self.product_page
+        return _PAGE.format(title=title, body=body).encode()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class StepTimer:
+    """Times each step of a checkout."""
+
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.steps = {}
+
+    def mark(self, step):
+        # Steps that are repeated (e.g. the checkout page after a password re-prompt) add up
+        now = time.perf_counter()
+        self.steps[step] = self.steps.get(step, 0) + now - self.last
+        self.last = now
+
+    def total(self):
+        return self.last - self.start
+
+
+@contextmanager
+def stand_in(site, browser_name):
+    """Point checkout at the stand-in site using one of the browsers regardless of the settings."""
+    names = [
+        "BROWSER_NAME",
+        "DRIVER_WRAPPER",
+        "PREBUILT_OPTIONS",
+        "USER_TAKEOVER",
+        "checkout_url",
+    ]
+    saved = {name: getattr(browser, name) for name in names}
+
+    browser.BROWSER_NAME = browser_name
+    browser.DRIVER_WRAPPER = DRIVER_NAMES[browser_name]
+    browser.PREBUILT_OPTIONS = [browser._get_options(False), browser._get_options(True)]
+    browser.USER_TAKEOVER = STEP_TIMEOUT
+    browser.checkout_url = f"{site.base_url}/checkout/r/fast-track"
+
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(browser, name, value)
+
+
+def measure(site, flow, trials):
+    """Check out `trials` times and return the timer of every checkout that placed the order."""
+    site.flow = flow
+    funds = FundsLedger(GRAND_TOTAL * trials)
+    timers = []
+
+    for _ in range(trials):
+        timer = StepTimer()
+        reservation = funds.reserve(GRAND_TOTAL)
+
+        # Keep the purchase messages from filling up the results
+        with redirect_stdout(io.StringIO()):
+            purchased = browser.purchase(
+                site.product_url(),
+                [],
+                True,
+                None,
+                None,
+                None,
+                "Benchmark",
+                "password",
+                "123",
+                funds,
+                reservation,
+                timer=timer,
+            )
+
+        # Checkouts that didn't place the order hold on to their funds
+        funds.release(reservation)
+
+        if purchased:
+            timers.append(timer)
+    return timers
+
+
+def benchmark(trials=5):
+    """Measure how long each step of checkout takes with each browser."""
+    print(
+        f"Checking out {trials} time{'s' if trials > 1 else ''} with each flow and browser (no orders are placed).\n"
+    )
+
+    site = CheckoutSite()
+    rows = []
+    for browser_name in DRIVER_NAMES:
+        if not is_installed(browser_name):
+            Colors.warn(f"Skipping {browser_name.title()} since it isn't installed.")
+            continue
+
+        with stand_in(site, browser_name):
+            for flow in FLOWS:
+                with loading(f"Checking out with {browser_name.title()} ({flow})"):
+                    try:
+                        timers = measure(site, flow, trials)
+                    except WebDriverException as e:
+                        timers = []
+                        Colors.print(e, properties=["fail"])
+
+                if len(timers) < trials:
+                    Colors.warn(
+                        f"{trials - len(timers)} of {trials} {flow} checkouts with {browser_name.title()} didn't place the order."
+                    )
+                if not timers:
+                    continue
+
+                steps = {}
+                for timer in timers:
+                    for step, seconds in timer.steps.items():
+                        steps.setdefault(step, []).append(seconds)
+
+                rows.append(
+                    [
+                        browser_name.title(),
+                        flow,
+                        "\n".join(
+                            f"{step}: {statistics.median(times) * 1000:,.0f} ms"
+                            for step, times in steps.items()
+                        ),
+                        f"{statistics.median(timer.total() for timer in timers):,.2f} s",
+                    ]
+                )
+
+    site.close()
+
+    if rows:
+        print_table(
+            ["Browser", "Flow", "Median per step", "Time to place order"],
+            rows,
+            justifications=["left", "left", "left", "center"],
+        )
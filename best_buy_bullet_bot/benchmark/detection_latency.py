@@ -0,0 +1,186 @@
+import random
+import time
+from contextlib import contextmanager
+from threading import Event, Thread
+
+from selenium.common.exceptions import WebDriverException
+
+from best_buy_bullet_bot import tracker
+from best_buy_bullet_bot.benchmark import FixtureServer, ResourceMonitor, percentile
+from best_buy_bullet_bot.data.setting_utils import SOUND_MODES
+from best_buy_bullet_bot.rate_control import RateController
+from best_buy_bullet_bot.tracker.metrics import MetricsRecorder
+from best_buy_bullet_bot.tracker.outage import OutageMonitor
+from best_buy_bullet_bot.tracker.scheduler import PollScheduler
+from best_buy_bullet_bot.tracker.shared_state import (
+    SharedPause,
+    SharedProgress,
+    SharedQty,
+    SharedState,
+)
+from best_buy_bullet_bot.utils import Colors, loading, print_table
+
+PATHS = ["requests", "selenium"]
+DETECTION_TIMEOUT = 30
+
+
+@contextmanager
+def tracking_path(path):
+    """Point the trackers at one of the tracking paths regardless of the settings.
+
+    The requests path runs exactly like hybrid mode so the trackers can be
+    stopped by setting the quantity to 0.
+    """
+    names = [
+        "AUTO_CHECKOUT",
+        "HYBRID_MODE",
+        "BROWSER_TRACKING",
+        "BROWSER_POOL",
+        "SOUND_MODE",
+        "RATE_CONTROLLER",
+    ]
+    saved = {name: getattr(tracker, name) for name in names}
+
+    tracker.AUTO_CHECKOUT = True
+    tracker.HYBRID_MODE = path == PATHS[0]
+    tracker.BROWSER_TRACKING = path == PATHS[1]
+    tracker.BROWSER_POOL = None
+    tracker.SOUND_MODE = SOUND_MODES[0]
+    tracker.RATE_CONTROLLER = RateController([])
+
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(tracker, name, value)
+
+
+def _start_trackers(url, state, stock):
+    headers = {"referer": url}
+    pbar = SharedProgress(state, 0)
+    metrics = MetricsRecorder(state.metrics, 0)
+    scheduler = PollScheduler("Benchmark", tracker.NUM_THREADS, metrics)
+    outage = OutageMonitor()
+    threads = [
+        Thread(
+            target=tracker.run,
+            args=[
+                "Benchmark",
+                url,
+                SharedQty(state, 0),
+                [],
+                state.lock,
+                SharedPause(state),
+                pbar,
+                metrics,
+                scheduler,
+                outage,
+                stock,
+                Event(),
+                0,
+                state.ledger,
+                headers,
+            ],
+            daemon=True,
+        )
+        for _ in range(tracker.NUM_THREADS)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def measure(path, trials):
+    server = FixtureServer()
+    state = SharedState(1, [-1], 1)
+    paused = SharedPause(state)
+    monitor = ResourceMonitor()
+    stock = tracker.Stock()
+
+    with tracking_path(path):
+        threads = _start_trackers(server.url(), state, stock)
+
+        # Wait for the first successful poll (browsers take a while to start)
+        start = time.perf_counter()
+        while not state.iterations[0]:
+            if not any(thread.is_alive() for thread in threads):
+                server.close()
+                return
+            if time.perf_counter() - start > 120:
+                break
+            time.sleep(0.1)
+
+        latencies = []
+        monitor.reset()
+        polls = state.iterations[0]
+
+        for _ in range(trials):
+            server.set_state("sold_out")
+            stock.value = False
+            paused.clear()
+
+            # Restock at a random point in the polling cycle
+            time.sleep(random.uniform(0.5, 1.5))
+            restock_time = server.set_state("in_stock")
+
+            if state.pause_event.wait(DETECTION_TIMEOUT):
+                latencies.append(time.perf_counter() - restock_time)
+
+        polls = (state.iterations[0] - polls) / (
+            time.perf_counter() - monitor.start_time
+        )
+        cpu = monitor.cpu_percent()
+        rss = monitor.rss()
+
+        # Stop the trackers
+        state.qtys[0] = 0
+        server.set_state("sold_out")
+        paused.clear()
+        for thread in threads:
+            thread.join(DETECTION_TIMEOUT)
+
+    server.close()
+    return latencies, polls, cpu, rss
+
+
+def benchmark(trials=20):
+    """Measure how long it takes the trackers to detect a restock."""
+    print(
+        f"Simulating {trials} restocks with {tracker.NUM_THREADS} thread{'s' if tracker.NUM_THREADS > 1 else ''} per URL.\n"
+    )
+
+    rows = []
+    for path in PATHS:
+        with loading(f"Benchmarking the {path} tracker"):
+            try:
+                results = measure(path, trials)
+            except WebDriverException as e:
+                results = None
+                Colors.print(e, properties=["fail"])
+
+        if results is None:
+            Colors.print(
+                f"Unable to benchmark the {path} tracker.", properties=["fail"]
+            )
+            continue
+
+        latencies, polls, cpu, rss = results
+        if len(latencies) < trials:
+            Colors.warn(
+                f"The {path} tracker missed {trials - len(latencies)} of {trials} restocks."
+            )
+        if not latencies:
+            continue
+
+        rows.append(
+            [path.title()]
+            + [f"{percentile(latencies, p) * 1000:,.0f} ms" for p in [50, 95, 99]]
+            + [f"{polls:,.2f}", f"{cpu:.0f}%", f"{rss / 2**20:,.0f} MB"]
+        )
+
+    if rows:
+        print_table(
+            ["Tracker", "p50", "p95", "p99", "Polls/s", "CPU", "Memory"],
+            rows,
+            justifications=["left"] + ["center"] * 6,
+        )
@@ -0,0 +1,141 @@
+import statistics
+import sys
+import time
+import tracemalloc
+
+from best_buy_bullet_bot.benchmark import load_fixture
+from best_buy_bullet_bot.detection import CHUNK_SIZE, StreamScanner, parse_page
+from best_buy_bullet_bot.utils import Colors, loading, print_table
+
+# Anonymized product pages covering every kind of page a tracker can run
+# into and whether the product on each page can be added to the cart
+CORPUS = {
+    "in_stock": True,
+    "sold_out": False,
+    "coming_soon": False,
+    "grouped_skus": True,
+    # An accessory that can be added to the cart comes before the product
+    "accessory_in_stock": False,
+}
+
+
+def _scan(page):
+    """Feed the page to the stream scanner the way it arrives from Best Buy."""
+    scanner = StreamScanner(need_title=True)
+    for start in range(0, len(page), CHUNK_SIZE):
+        if scanner.feed(page[start : start + CHUNK_SIZE]):
+            break
+    return scanner.result()
+
+
+BACKENDS = {
+    "html.parser": lambda page: parse_page(page, need_title=True),
+    "lxml": lambda page: parse_page(page, need_title=True, parser="lxml"),
+    "stream": _scan,
+}
+
+
+def _available_backends(page):
+    from bs4 import FeatureNotFound
+
+    backends = {}
+    for name, backend in BACKENDS.items():
+        try:
+            backend(page)
+        except FeatureNotFound:
+            # lxml is optional
+            Colors.warn(f"Skipping {name} since it isn't installed.")
+        else:
+            backends[name] = backend
+    return backends
+
+
+def measure(backend, pages, trials):
+    """Return the median time to parse each page and the peak memory used to parse any of them."""
+    times = []
+    for page in pages:
+        samples = []
+        for _ in range(trials):
+            start = time.perf_counter()
+            backend(page)
+            samples.append(time.perf_counter() - start)
+        times.append(statistics.median(samples))
+
+    # Tracing allocations slows everything down so it is done separately
+    peak = 0
+    for page in pages:
+        tracemalloc.start()
+        backend(page)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return times, peak
+
+
+def cross_check(backends, pages):
+    """Return the pages where the backends disagree on the availability or title
+    or get the availability wrong."""
+    mismatches = []
+    for (name, available), page in zip(CORPUS.items(), pages):
+        results = {
+            backend_name: backend(page)[:2]
+            for backend_name, backend in backends.items()
+        }
+        if len(set(results.values())) > 1 or any(
+            result[0] != available for result in results.values()
+        ):
+            mismatches.append((name, results))
+    return mismatches
+
+
+def benchmark(trials=100):
+    """Compare how quickly each parser extracts the availability and title of a page."""
+    pages = [load_fixture(name) for name in CORPUS]
+    backends = _available_backends(pages[0])
+    print(
+        f"Parsing {len(pages)} pages {trials} time{'s' if trials > 1 else ''} with each parser.\n"
+    )
+
+    rows = []
+    for name, backend in backends.items():
+        with loading(f"Benchmarking {name}"):
+            times, peak = measure(backend, pages, trials)
+
+        total = sum(times)
+        rows.append(
+            [
+                name,
+                f"{len(pages) / total:,.0f}",
+                f"{sum(map(len, pages)) / total / 2**20:,.1f}",
+                "\n".join(
+                    f"{page}: {seconds * 1000:,.2f} ms"
+                    for page, seconds in zip(CORPUS, times)
+                ),
+                f"{peak / 2**10:,.0f} KB",
+            ]
+        )
+
+    print_table(
+        ["Parser", "Pages/s", "MB/s", "Time per page", "Peak memory"],
+        rows,
+        justifications=["left", "center", "center", "left", "center"],
+    )
+
+    mismatches = cross_check(backends, pages)
+    for page, results in mismatches:
+        Colors.print(
+            f"\nThe parsers disagree on {page} (available={CORPUS[page]}):",
+            *[
+                f"{name}: available={available}, title={title!r}"
+                for name, (available, title) in results.items()
+            ],
+            sep="\n",
+            properties=["fail"],
+        )
+
+    if mismatches:
+        sys.exit(1)
+    Colors.print(
+        "\nEvery parser found the right availability and the same title on every page.",
+        properties=["success"],
+    )
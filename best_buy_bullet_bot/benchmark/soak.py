@@ -0,0 +1,332 @@
+import json
+import multiprocessing as mp
+import os
+import time
+
+import psutil
+
+from best_buy_bullet_bot.benchmark import FixtureServer, percentile
+from best_buy_bullet_bot.data import SHARED_DIR
+from best_buy_bullet_bot.data.setting_utils import ENGINES, SOUND_MODES
+from best_buy_bullet_bot.tracker.metrics import create_metrics, poll_counts
+from best_buy_bullet_bot.utils import Colors, print_table
+
+REPORT_DIR = os.path.join(SHARED_DIR, "soak_test.json")
+
+# Thread settings every engine is soaked with
+THREAD_SETTINGS = [1, 2, 4]
+
+# Smallest number of URLs tracked (doubled until the maximum is reached)
+MIN_URLS = 25
+
+# Polls made while the workers are starting up aren't counted
+WARMUP = 5
+
+SAMPLE_INTERVAL = 1
+
+# Adding URLs stops paying off once polls/s grows by less than this share
+# of what it would if it scaled with the number of URLs
+KNEE_EFFICIENCY = 0.5
+
+
+def _serve(port):
+    server = FixtureServer("sold_out")
+    port.value = server.httpd.server_address[1]
+    while True:
+        time.sleep(60)
+
+
+def _apply(overrides):
+    """Track with the soak test settings regardless of the user's settings."""
+    from best_buy_bullet_bot import tracker
+    from best_buy_bullet_bot.tracker import async_engine
+
+    for module in [tracker, async_engine]:
+        for name, value in overrides.items():
+            if hasattr(module, name):
+                setattr(module, name, value)
+
+
+def _init_worker(overrides, *args):
+    from best_buy_bullet_bot import tracker
+
+    _apply(overrides)
+    tracker.init_worker(*args)
+
+
+def _track(engine, threads, urls, metrics):
+    """Run the tracker the same way `start` does until this process is killed."""
+    from multiprocessing import Pool
+
+    from best_buy_bullet_bot import tracker
+    from best_buy_bullet_bot.data.url_utils import QtyManager
+    from best_buy_bullet_bot.funds import FundsLedger
+    from best_buy_bullet_bot.rate_control import RateController
+    from best_buy_bullet_bot.tracker.progress_bar import IndefeniteProgressBar
+    from best_buy_bullet_bot.tracker.shared_state import SharedState
+    from best_buy_bullet_bot.tracker.workers import Shards, default_workers
+
+    overrides = {
+        "NUM_THREADS": threads,
+        "AUTO_CHECKOUT": False,
+        "HYBRID_MODE": False,
+        "BROWSER_TRACKING": False,
+        "SOUND_MODE": SOUND_MODES[0],
+    }
+    _apply(overrides)
+
+    titles = [f"Soak test {index + 1}" for index in range(len(urls))]
+    headers = {"accept": "*/*", "user-agent": "3B Bot soak test"}
+    rate_controller = RateController(urls)
+
+    if engine == ENGINES[1]:
+        from best_buy_bullet_bot.tracker.async_engine import track_all
+
+        track_all(
+            titles,
+            urls,
+            [QtyManager(-1) for _ in urls],
+            [None] * len(urls),
+            FundsLedger(0),
+            headers,
+            metrics,
+            rate_controller,
+        )
+        return
+
+    num_workers = min(tracker.NUM_WORKERS or default_workers(), len(urls))
+    shards = Shards(list(range(len(urls))), num_workers)
+    state = SharedState(0, [-1] * len(urls), len(urls))
+
+    # The metrics are read by the soak test
+    state.metrics = metrics
+    state.attach_progress_bar(IndefeniteProgressBar())
+
+    tasks = [
+        [title, url, index, index, False, None, None, "", "", None, headers]
+        for index, (title, url) in enumerate(zip(titles, urls))
+    ]
+    with Pool(
+        num_workers,
+        _init_worker,
+        [overrides, False, state, None, rate_controller, shards, None],
+    ) as p:
+        result = p.starmap_async(
+            tracker.work, [[worker, tasks] for worker in range(num_workers)]
+        )
+        for index, title in enumerate(titles):
+            shards.publish_title(index, title)
+
+        while not result.ready():
+            result.wait(tracker.REBALANCE_INTERVAL)
+            shards.rebalance()
+
+
+def _tree(process):
+    try:
+        return [process] + process.children(recursive=True)
+    except psutil.Error:
+        return [process]
+
+
+def _sample(process, server):
+    """Resources used by the tracker (and the server) right now."""
+    rss = fds = 0
+    for child in _tree(process):
+        try:
+            rss += child.memory_info().rss
+            fds += child.num_handles() if os.name == "nt" else child.num_fds()
+        except psutil.Error:
+            pass
+
+    return {
+        # The main process is the one that hands titles out and renders the progress bar
+        "main cpu": process.cpu_percent(),
+        "server cpu": server.cpu_percent(),
+        "rss": rss,
+        "fds": fds,
+    }
+
+
+def soak(engine, threads, urls, duration, server):
+    """Track the URLs for `duration` seconds and sample the resources used along the way."""
+    metrics = create_metrics(len(urls))
+    tracker_process = mp.Process(target=_track, args=[engine, threads, urls, metrics])
+    tracker_process.start()
+    process = psutil.Process(tracker_process.pid)
+
+    samples = []
+    polls = None
+    start = time.perf_counter()
+    try:
+        while tracker_process.is_alive():
+            time.sleep(SAMPLE_INTERVAL)
+            elapsed = time.perf_counter() - start
+
+            if polls is None and elapsed >= WARMUP:
+                polls, window_start = poll_counts(metrics), time.perf_counter()
+
+            counts = poll_counts(metrics)
+            window_end = time.perf_counter()
+
+            sample = _sample(process, server)
+            sample["time"] = elapsed
+            sample["polls"] = sum(counts)
+            samples.append(sample)
+
+            if elapsed >= duration + WARMUP:
+                break
+    finally:
+        # Workers are children of the tracker process
+        for child in reversed(_tree(process)):
+            try:
+                child.kill()
+            except psutil.Error:
+                pass
+        tracker_process.join()
+
+    if polls is None:
+        return None
+
+    window = window_end - window_start
+    counted = [after - before for before, after in zip(polls, counts)]
+    intervals = [window / count if count else float("inf") for count in counted]
+
+    # CPU is only meaningful once everything has started up
+    steady = [sample for sample in samples if sample["time"] >= WARMUP] or samples
+    return {
+        "engine": engine,
+        "threads": threads,
+        "urls": len(urls),
+        "polls per second": sum(counted) / window,
+        "interval p50": percentile(intervals, 50),
+        "interval p95": percentile(intervals, 95),
+        "starved urls": counted.count(0),
+        "main cpu": sum(sample["main cpu"] for sample in steady) / len(steady),
+        "server cpu": sum(sample["server cpu"] for sample in steady) / len(steady),
+        "peak rss": max(sample["rss"] for sample in samples),
+        "peak fds": max(sample["fds"] for sample in samples),
+        "samples": samples,
+    }
+
+
+def find_knee(results):
+    """The most URLs that could be added while polls/s still kept up (None if it never stopped keeping up)."""
+    for prev, current in zip(results, results[1:]):
+        expected = prev["polls per second"] * (current["urls"] / prev["urls"] - 1)
+        gained = current["polls per second"] - prev["polls per second"]
+        if expected <= 0 or gained / expected < KNEE_EFFICIENCY:
+            return prev
+    return None
+
+
+def _interval(seconds):
+    return "never" if seconds == float("inf") else f"{seconds * 1000:,.0f}"
+
+
+def soak_test(max_urls=200, duration=20):
+    """Find where tracking stops scaling with the number of URLs for each engine and thread setting."""
+    url_counts = []
+    count = MIN_URLS
+    while count < max_urls:
+        url_counts.append(count)
+        count *= 2
+    url_counts.append(max_urls)
+
+    runs = len(ENGINES) * len(THREAD_SETTINGS) * len(url_counts)
+    print(
+        f"Soaking {runs} configurations for {duration + WARMUP:,.0f} seconds each "
+        f"(about {runs * (duration + WARMUP) / 60:,.0f} minutes).\n"
+    )
+
+    # The server gets a process of its own so it doesn't compete with the tracker
+    port = mp.Value("i", 0)
+    server_process = mp.Process(target=_serve, args=[port], daemon=True)
+    server_process.start()
+    while not port.value:
+        time.sleep(0.1)
+    urls = [
+        f"http://127.0.0.1:{port.value}/site/soak-test/{sku}.p?skuId={sku}"
+        for sku in range(6400000, 6400000 + max_urls)
+    ]
+    server = psutil.Process(server_process.pid)
+
+    results = []
+    for engine in ENGINES:
+        for threads in THREAD_SETTINGS:
+            curve = []
+            for count in url_counts:
+                print(
+                    f"{engine}, {threads} thread{'s' if threads > 1 else ''}, {count} URLs"
+                )
+                result = soak(engine, threads, urls[:count], duration, server)
+                if result is None:
+                    Colors.warn(
+                        f"The {engine} engine stopped before it could be measured."
+                    )
+                    break
+                curve.append(result)
+            results.append((engine, threads, curve))
+
+    server_process.kill()
+
+    rows = []
+    knees = []
+    for engine, threads, curve in results:
+        for result in curve:
+            rows.append(
+                [
+                    engine,
+                    threads,
+                    result["urls"],
+                    f"{result['polls per second']:,.1f}",
+                    f"{_interval(result['interval p50'])} / {_interval(result['interval p95'])} ms",
+                    result["starved urls"],
+                    f"{result['main cpu']:.0f}% / {result['server cpu']:.0f}%",
+                    f"{result['peak rss'] / 2**20:,.0f} MB",
+                    result["peak fds"],
+                ]
+            )
+
+        if curve:
+            knee = find_knee(curve)
+            knees.append(
+                [
+                    engine,
+                    threads,
+                    f"{knee['urls']} URLs"
+                    if knee
+                    else f"Over {curve[-1]['urls']} URLs",
+                    f"{(knee or curve[-1])['polls per second']:,.1f}",
+                ]
+            )
+
+    print()
+    print_table(
+        [
+            "Engine",
+            "Threads",
+            "URLs",
+            "Polls/s",
+            "Interval (p50/p95)",
+            "Starved",
+            "CPU (main/server)",
+            "Memory",
+            "FDs",
+        ],
+        rows,
+        justifications=["left"] + ["center"] * 8,
+    )
+    print_table(
+        ["Engine", "Threads", "Knee", "Polls/s"],
+        knees,
+        justifications=["left"] + ["center"] * 3,
+    )
+    print(
+        "Past the knee, adding URLs barely increases polls/s and every URL is checked less often. "
+        "If the server CPU is near 100% the server is the bottleneck rather than the tracker."
+    )
+
+    with open(REPORT_DIR, "w") as f:
+        json.dump([result for _, _, curve in results for result in curve], f, indent=4)
+    print(f"\nEvery sample was saved to {REPORT_DIR}.")
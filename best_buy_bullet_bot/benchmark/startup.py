@@ -0,0 +1,102 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from best_buy_bullet_bot.data import STORE_ENV_VAR
+from best_buy_bullet_bot.utils import Colors, loading, print_table
+
+# Commands that only read local data and should start up almost instantly
+COMMANDS = ["view-urls", "view-settings", "count-cores"]
+
+# Longest a simple command may take to run (in seconds)
+STARTUP_BUDGET = 0.75
+
+# Packages that simple commands should never need to import
+HEAVY_PACKAGES = ["selenium", "webdriver_manager", "aiohttp", "playsound"]
+
+_IMPORT_TIME = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure(command):
+    """Run a command and return how long it took and how long each module took to import."""
+    # Let the command find its own data store instead of the one we're using
+    env = {key: value for key, value in os.environ.items() if key != STORE_ENV_VAR}
+
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "best_buy_bullet_bot", command],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        env=env,
+    )
+    elapsed = time.perf_counter() - start
+
+    imports = {
+        name: (int(cumulative) / 1e6, len(indent) <= 1)
+        for cumulative, indent, name in _IMPORT_TIME.findall(process.stderr)
+    }
+    return elapsed, imports
+
+
+def benchmark(trials=5):
+    """Check that simple commands start up within the budget."""
+    print(
+        f"Running each command {trials} time{'s' if trials > 1 else ''} (budget: {STARTUP_BUDGET * 1000:,.0f} ms).\n"
+    )
+
+    rows = []
+    over_budget = {}
+    for command in COMMANDS:
+        with loading(f"Timing {command}"):
+            results = [measure(command) for _ in range(trials)]
+
+        elapsed = statistics.median(result[0] for result in results)
+        imports = results[-1][1]
+        heavy = [
+            name
+            for name in imports
+            if name.split(".")[0] in HEAVY_PACKAGES
+            or name.startswith("best_buy_bullet_bot.browser")
+        ]
+
+        passed = elapsed <= STARTUP_BUDGET and not heavy
+        if not passed:
+            over_budget[command] = imports
+        rows.append(
+            [
+                command,
+                f"{elapsed * 1000:,.0f} ms",
+                ", ".join(heavy) or "None",
+                "Pass" if passed else "Fail",
+            ]
+        )
+
+    print_table(
+        ["Command", "Median", "Heavy imports", "Result"],
+        rows,
+        justifications=["left"] + ["center"] * 3,
+    )
+
+    for command, imports in over_budget.items():
+        # Only list modules that were imported directly by the bot
+        slowest = sorted(
+            [
+                (seconds, name)
+                for name, (seconds, top_level) in imports.items()
+                if top_level
+            ],
+            reverse=True,
+        )
+        Colors.print(
+            f"\nSlowest imports of {command}:",
+            *[f"{name}: {seconds * 1000:,.0f} ms" for seconds, name in slowest[:5]],
+            sep="\n",
+            properties=["warning"],
+        )
+
+    if over_budget:
+        sys.exit(1)
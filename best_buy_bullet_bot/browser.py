@@ -1,9 +1,16 @@
 import logging
 import sys
+import time
+from threading import Thread
 
 import clipboard
 import requests
-from selenium.common.exceptions import NoSuchWindowException, TimeoutException
+from selenium.common.exceptions import (
+    NoSuchWindowException,
+    TimeoutException,
+    WebDriverException,
+)
+from selenium.webdriver import Remote
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
@@ -14,8 +21,10 @@ from best_buy_bullet_bot.data.browser_login import (
     load_cookies,
     save_cookies,
 )
+from best_buy_bullet_bot.data.metadata_cache import get_price, save_price
 from best_buy_bullet_bot.data.setting_utils import (
     DRIVER_NAMES,
+    DRIVER_REFRESH_INTERVAL,
     change_browser,
     get_settings,
     is_installed,
@@ -31,19 +40,27 @@ MAC = sys.platform == "darwin"
 USER_TAKEOVER = 20 * 60  # 20 min for user to takeover if the bot gets stuck
 
 logging.disable(logging.WARNING)
-try:
-    DRIVER_PATH = DRIVER_WRAPPER.manager().install()
-except ValueError:
-    if not is_installed(SETTINGS["browser"]):
-        Colors.print(
-            f"{SETTINGS['browser'].title()} is not installed on your computer.",
-            properties=["fail"],
-        )
-        change_browser()
 
 
-def _get_options(headless):
-    options = DRIVER_WRAPPER.options()
+def get_driver_path():
+    """Path to the driver of the current browser (resolved once per run)."""
+    try:
+        return DRIVER_WRAPPER.install()
+    except ValueError:
+        if not is_installed(SETTINGS["browser"]):
+            Colors.print(
+                f"{SETTINGS['browser'].title()} is not installed on your computer.",
+                properties=["fail"],
+            )
+            change_browser()
+            print("Run the command again to use the new browser.")
+            sys.exit(1)
+        raise
+
+
+def _get_options(headless, browser_name=None):
+    browser_name = browser_name or BROWSER_NAME
+    options = DRIVER_NAMES[browser_name].options()
     options.page_load_strategy = "none"
     options.add_argument("--proxy-server='direct://'")
     options.add_argument("--proxy-bypass-list=*")
@@ -52,7 +69,7 @@ def _get_options(headless):
         options.add_argument("--headless")
 
     # Suppress "DevTools listening on ws:..." message
-    if BROWSER_NAME == "chrome":
+    if browser_name == "chrome":
         options.add_experimental_option("excludeSwitches", ["enable-logging"])
 
     return options
@@ -61,12 +78,57 @@ def _get_options(headless):
 PREBUILT_OPTIONS = [_get_options(False), _get_options(True)]
 
 
+class AttachedDriver(Remote):
+    """Connects to a browser session that was started by another process."""
+
+    def __init__(self, executor_url, session_id, w3c):
+        self._attach_to = (session_id, w3c)
+        super().__init__(command_executor=executor_url, desired_capabilities={})
+
+    def start_session(self, capabilities, browser_profile=None):
+        self.session_id, self.w3c = self._attach_to
+        self.command_executor.w3c = self.w3c
+
+    def quit(self):
+        # The browser belongs to the process that started it
+        pass
+
+
+def get_session(driver):
+    """Everything another process needs to attach to `driver`."""
+    return driver.command_executor._url, driver.session_id, driver.w3c
+
+
 def get_user_agent():
+    """User agent of the current browser.
+
+    Reading it means launching the browser, so it is saved in the settings
+    along with the browser version and only read again once the browser updates.
+    If the version of the browser can't be found it is read again every
+    `DRIVER_REFRESH_INTERVAL` instead (like the driver).
+    """
+    version = DRIVER_WRAPPER.browser_version()
+    user_agents = dict(get_settings()["user agents"])
+    cached = user_agents.get(BROWSER_NAME, {})
+    if "user agent" in cached and (
+        cached.get("version") == version
+        if version is not None
+        else time.time() - cached.get("installed", 0) < DRIVER_REFRESH_INTERVAL
+    ):
+        return cached["user agent"]
+
     driver = DRIVER_WRAPPER.driver(
-        executable_path=DRIVER_PATH, options=PREBUILT_OPTIONS[True]
+        executable_path=get_driver_path(), options=PREBUILT_OPTIONS[True]
     )
     user_agent = driver.execute_script("return navigator.userAgent")
     driver.quit()
+
+    user_agents[BROWSER_NAME] = {
+        "version": version,
+        "user agent": user_agent,
+        "installed": time.time(),
+    }
+    update_setting("user agents", user_agents)
     return user_agent
 
 
@@ -79,8 +141,20 @@ def fast_text(text):
     return (Keys.COMMAND if MAC else Keys.CONTROL) + "v"
 
 
-account_page_url = "https://www.bestbuy.com/site/customer/myaccount"
-billing_url = "https://www.bestbuy.com/profile/c/billinginfo/cc"
+# Checkout can be pointed at a stand-in site (e.g. by the checkout benchmark)
+base_url = "https://www.bestbuy.com"
+account_page_url = f"{base_url}/site/customer/myaccount"
+billing_url = f"{base_url}/profile/c/billinginfo/cc"
+checkout_url = f"{base_url}/checkout/r/fast-track"
+
+# Where the standby checkout browser waits between purchases
+standby_url = account_page_url
+
+# Keeps the standby browser from being garbage collected (which would close it)
+STANDBY_DRIVER = None
+
+# How long an order can take to go through after placing it
+ORDER_TIMEOUT = 60
 
 
 def terminate(driver):
@@ -237,32 +311,85 @@ def perform_account_verification(driver, wait):
     Colors.print("Account has passed all checks!", properties=["success"])
 
 
+def _refresh_prices(urls, cookies, user_agent):
+    """Look up the current price of each URL and update the price cache."""
+    # BeautifulSoup is slow to import and only needed here
+    from bs4 import BeautifulSoup
+
+    with requests.Session() as session:
+        session.headers.update({"user-agent": user_agent})
+        for cookie in cookies:
+            session.cookies.set(
+                cookie["name"], cookie["value"], domain=cookie.get("domain")
+            )
+
+        for url in urls:
+            try:
+                response = session.get(url, timeout=10)
+                response.raise_for_status()
+            except requests.RequestException:
+                # The cached price is still used until it expires
+                continue
+
+            pricing = BeautifulSoup(response.content, "html.parser").find(
+                class_="pricing-price"
+            )
+            price = (
+                None
+                if pricing is None
+                else pricing.find(class_="priceView-customer-price")
+            )
+            if price is not None and price.span is not None:
+                save_price(url, money2float(price.span.get_text().strip()))
+
+
 def collect_item_cookies(driver, wait, urls):
     login_cookies_list = []
     predicted_prices = []
     price_element = None
+    cached_urls = []
 
     with loading("Collecting cookies for each URL"):
         for url in urls:
-            driver.get(url)
-
-            if price_element is not None:
-                wait.until(EC.staleness_of(price_element))
-
-            price_element = wait.until(
-                EC.presence_of_element_located(
-                    (
-                        By.CSS_SELECTOR,
-                        ".pricing-price > div > div > div > .priceView-hero-price.priceView-customer-price, "
-                        ".pricing-price > div > div > div > div > section > div > div > .priceView-hero-price.priceView-customer-price",
+            # Only visit products whose price hasn't been seen recently.
+            # For the others the cookies are read from the page we are already
+            # on, which is fine since the login cookies belong to the whole
+            # site and not to the product page.
+            item_price = get_price(url)
+            if item_price is None:
+                driver.get(url)
+
+                if price_element is not None:
+                    wait.until(EC.staleness_of(price_element))
+
+                price_element = wait.until(
+                    EC.presence_of_element_located(
+                        (
+                            By.CSS_SELECTOR,
+                            ".pricing-price > div > div > div > .priceView-hero-price.priceView-customer-price, "
+                            ".pricing-price > div > div > div > div > section > div > div > .priceView-hero-price.priceView-customer-price",
+                        )
                     )
                 )
-            )
-            item_price = price_element.text.split("\n")[0]
+                item_price = money2float(price_element.text.split("\n")[0])
+                save_price(url, item_price)
+            else:
+                cached_urls.append(url)
 
-            predicted_prices.append(money2float(item_price) * (1 + TAX))
+            predicted_prices.append(item_price * (1 + TAX))
             login_cookies_list.append(driver.get_cookies())
 
+    # Cached prices are refreshed in the background so a price change is
+    # picked up by the next start. Until then a stale prediction can't
+    # overspend since the reservation is adjusted to the grand total
+    # before an order is placed.
+    if cached_urls:
+        Thread(
+            target=_refresh_prices,
+            args=(cached_urls, driver.get_cookies(), get_user_agent()),
+            daemon=True,
+        ).start()
+
     return login_cookies_list, predicted_prices
 
 
@@ -297,15 +424,24 @@ def _browser_startup(
                 print("This was a one time test and will not be performed again.\n")
             update_setting("account verification", False)
 
-    item_cookies = collect_item_cookies(driver, wait, urls)
+    login_cookies_list, predicted_prices = collect_item_cookies(driver, wait, urls)
 
-    driver.quit()
-    return item_cookies
+    if headless:
+        driver.quit()
+        standby = None
+    else:
+        # Keep the logged in browser open so checkout can start immediately
+        global STANDBY_DRIVER
+        STANDBY_DRIVER = driver
+        driver.get(standby_url)
+        standby = get_session(driver)
+
+    return login_cookies_list, predicted_prices, standby
 
 
 def browser_startup(headless, *args, **kwargs):
     driver = DRIVER_WRAPPER.driver(
-        executable_path=DRIVER_PATH, options=PREBUILT_OPTIONS[headless]
+        executable_path=get_driver_path(), options=PREBUILT_OPTIONS[headless]
     )
 
     try:
@@ -323,15 +459,23 @@ def browser_startup(headless, *args, **kwargs):
         terminate(driver)
 
 
+def _mark(timer, step):
+    """Record that a checkout step has finished if the checkout is being timed."""
+    if timer is not None:
+        timer.mark(step)
+
+
 def _purchase(
     driver,
     title,
     password,
     cvv,
     money_manager,
+    reservation,
+    timer=None,
 ):
     # Go to the checkout page
-    driver.get("https://www.bestbuy.com/checkout/r/fast-track")
+    driver.get(checkout_url)
     wait = WebDriverWait(driver, USER_TAKEOVER)
 
     # Get to the CVV page
@@ -347,6 +491,8 @@ def _purchase(
             )
         )
 
+        _mark(timer, "checkout page")
+
         # If we got redirected to the cart
         if branch.get_attribute("class") == "btn btn-lg btn-block btn-primary":
             # Click "proceed to checkout" button
@@ -362,6 +508,7 @@ def _purchase(
                     )
                 )
             )
+            _mark(timer, "cart redirect")
 
             # If it wants to confirm our password
             if branch.get_attribute("class").strip() == "tb-input":
@@ -369,6 +516,7 @@ def _purchase(
                 driver.find_element_by_css_selector(
                     ".btn.btn-secondary.btn-lg.btn-block.c-button-icon.c-button-icon-leading.cia-form__controls__submit"
                 ).click()  # Click sign in button
+                _mark(timer, "password")
 
                 # We will loop back around and handle what comes next
             else:
@@ -387,6 +535,7 @@ def _purchase(
                 )
             )
         )
+        _mark(timer, "continue to payment")
     else:
         cvv_box = branch
     cvv_box.send_keys(fast_text(cvv))
@@ -397,16 +546,18 @@ def _purchase(
             ".order-summary__total > .order-summary__price > .cash-money"
         ).text
     )
+    _mark(timer, "cvv")
 
     # Make sure we have sufficient funds for the purchase
-    if money_manager.check_funds(grand_total):
+    if money_manager.adjust(reservation, grand_total):
         # Click place order button
         driver.find_element_by_css_selector(
             ".btn.btn-lg.btn-block.btn-primary, .btn.btn-lg.btn-block.btn-primary.button__fast-track"
         ).click()
+        _mark(timer, "place order")
 
         # Deduct grand total from available funds
-        money_manager.make_purchase(grand_total)
+        money_manager.commit(reservation)
 
         Colors.print(
             f"Successfully purchased {title}. The item was a grand total of ${grand_total:,.2f} leaving you with ${money_manager.get_funds():,.2f} of available funds.",
@@ -415,19 +566,55 @@ def _purchase(
         return True
     else:
         Colors.print(
-            f"Insufficient funds to purchase {title} which costs a grand total of ${grand_total:,.2f} while you only have ${money_manager.get_funds():,.2f} of available funds.",
+            f"Insufficient funds to purchase {title} which costs a grand total of ${grand_total:,.2f} while you only have ${money_manager.available():,.2f} of available funds.",
             properties=["fail"],
         )
     return False
 
 
+def _wait_for_order(driver):
+    """Wait for the order confirmation so leaving the page can't abort the order."""
+    try:
+        WebDriverWait(driver, ORDER_TIMEOUT).until(EC.url_contains("thank-you"))
+    except WebDriverException:
+        pass
+
+
+def _attach_standby(standby):
+    if standby is None:
+        return
+
+    driver = AttachedDriver(*standby)
+    try:
+        # Make sure the browser hasn't been closed
+        driver.window_handles
+        return driver
+    except WebDriverException:
+        return
+
+
 def purchase(
-    url, login_cookies, headless, headless_driver, headless_wait, *args, **kwargs
+    url,
+    login_cookies,
+    headless,
+    standby,
+    headless_driver,
+    headless_wait,
+    *args,
+    timer=None,
+    **kwargs,
 ):
-    if not headless:
-        # Create a new visible driver for the checkout process
+    # In hybrid mode there is no tracker driver to hand over
+    hybrid = headless_driver is None
+    driver = None if headless else _attach_standby(standby)
+
+    if driver is not None:
+        # The standby browser is already logged in
+        driver.get(url)
+    elif not headless or hybrid:
+        # Create a new driver for the checkout process
         driver = DRIVER_WRAPPER.driver(
-            executable_path=DRIVER_PATH, options=PREBUILT_OPTIONS[False]
+            executable_path=get_driver_path(), options=PREBUILT_OPTIONS[headless]
         )
         driver.get(url)
         for cookie in login_cookies:
@@ -435,25 +622,55 @@ def purchase(
     else:
         # Use the old headless driver so we don't have to create a new one
         driver = headless_driver
+    _mark(timer, "open browser")
 
-    # Have the existing headless tracker driver click the add-to-cart button
-    headless_wait.until(
-        EC.element_to_be_clickable(
-            (
-                By.CSS_SELECTOR,
-                ".fulfillment-add-to-cart-button > div > div > button",
-            )
-        )
-    ).click()
+    if hybrid:
+        # Reload the product page now that we are logged in
+        if not isinstance(driver, AttachedDriver):
+            driver.get(url)
+        cart_wait = WebDriverWait(driver, 120)
+    else:
+        # Have the existing headless tracker driver click the add-to-cart button
+        cart_wait = headless_wait
 
+    purchased = False
     try:
-        return _purchase(driver, *args, **kwargs)
-    except TimeoutException:
-        Colors.print(
-            "3B Bot got stuck and nobody took over. Tracking will resume.",
-            properties=["fail"],
-        )
-    except NoSuchWindowException:
-        driver.quit()
+        cart_wait.until(
+            EC.element_to_be_clickable(
+                (
+                    By.CSS_SELECTOR,
+                    ".fulfillment-add-to-cart-button > div > div > button",
+                )
+            )
+        ).click()
+        _mark(timer, "add to cart")
+
+        try:
+            purchased = _purchase(driver, *args, timer=timer, **kwargs)
+            return purchased
+        except TimeoutException:
+            Colors.print(
+                "3B Bot got stuck and nobody took over. Tracking will resume.",
+                properties=["fail"],
+            )
+        except NoSuchWindowException:
+            if not (hybrid and headless):
+                driver.quit()
+
+    finally:
+        # Checkout drivers aren't reused in hybrid mode
+        if hybrid and headless:
+            if purchased:
+                _wait_for_order(driver)
+            driver.quit()
+
+        # Get the standby browser ready for the next purchase. After a purchase
+        # it stays on the order confirmation and is sent to the product page
+        # by the next one.
+        elif isinstance(driver, AttachedDriver) and not purchased:
+            try:
+                driver.get(standby_url)
+            except WebDriverException:
+                pass
 
     return False
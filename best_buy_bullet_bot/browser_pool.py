@@ -0,0 +1,182 @@
+import ctypes
+import multiprocessing as mp
+from threading import Thread
+from time import sleep
+
+import psutil
+from selenium.webdriver.remote.webelement import WebElement
+
+from best_buy_bullet_bot.browser import (
+    DRIVER_WRAPPER,
+    PREBUILT_OPTIONS,
+    AttachedDriver,
+    get_driver_path,
+    get_session,
+)
+from best_buy_bullet_bot.utils import loading, print_table
+
+
+def _wrap(result, tab):
+    if isinstance(result, WebElement):
+        return TabElement(result, tab)
+    if isinstance(result, list):
+        return [_wrap(item, tab) for item in result]
+    return result
+
+
+class _TabProxy:
+    """Runs every call in the context of a tab.
+
+    Only one tab per browser can receive commands at a time, so calls are made
+    while holding the lock of the browser and after switching to the right tab.
+    """
+
+    def __init__(self, target, tab):
+        self._target = target
+        self._tab = tab
+
+    def _call(self, func, *args, **kwargs):
+        with self._tab.lock:
+            self._tab.activate()
+            return _wrap(func(*args, **kwargs), self._tab)
+
+    def __getattr__(self, name):
+        attr = getattr(type(self._target), name, None)
+
+        # Properties such as `current_url` query the browser when accessed
+        if isinstance(attr, property):
+            return self._call(getattr, self._target, name)
+
+        attr = getattr(self._target, name)
+        if callable(attr):
+            return lambda *args, **kwargs: self._call(attr, *args, **kwargs)
+        return attr
+
+
+class TabElement(_TabProxy):
+    pass
+
+
+class Tab(_TabProxy):
+    """A browser tab that can be used like a regular driver."""
+
+    def __init__(self, driver, lock, active_tab, tab_id):
+        self.driver = driver
+        self.lock = lock
+        self.active_tab = active_tab
+        self.tab_id = tab_id
+
+        with lock:
+            handles = set(driver.window_handles)
+            driver.execute_script("window.open('about:blank');")
+            (self.handle,) = set(driver.window_handles) - handles
+            self.activate()
+
+        super().__init__(driver, self)
+
+    def activate(self):
+        # Skip the round trip if the tab is already selected
+        if self.active_tab.value != self.tab_id:
+            self.driver.switch_to.window(self.handle)
+            self.active_tab.value = self.tab_id
+
+    def close(self):
+        with self.lock:
+            self.activate()
+            self.driver.close()
+            self.active_tab.value = -1
+
+    def quit(self):
+        self.close()
+
+
+class BrowserPool:
+    """Multiplexes trackers onto a fixed number of headless browsers.
+
+    Each tracker thread gets its own tab in one of the browsers. The pool
+    can only be handed to a process when it is created (e.g. as a `Pool`
+    initializer argument).
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = mp.Lock()
+        self.browser_locks = [mp.Lock() for _ in range(size)]
+        self.active_tabs = [mp.RawValue(ctypes.c_long, -1) for _ in range(size)]
+        self.num_tabs = mp.RawArray(ctypes.c_long, size)
+        self.tabs_opened = mp.RawValue(ctypes.c_long, 0)
+
+        with loading(f"Starting {size} browser{'s' if size > 1 else ''}"):
+            self.drivers = [
+                DRIVER_WRAPPER.driver(
+                    executable_path=get_driver_path(), options=PREBUILT_OPTIONS[True]
+                )
+                for _ in range(size)
+            ]
+        self.sessions = [get_session(driver) for driver in self.drivers]
+
+        # Each process connects to the browsers the first time it needs them
+        self._attached = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["drivers"] = None
+        state["_attached"] = None
+        return state
+
+    def open_tab(self):
+        # Spread tabs evenly across all browsers
+        with self.lock:
+            tab_id = self.tabs_opened.value
+            self.tabs_opened.value += 1
+            browser = tab_id % self.size
+            self.num_tabs[browser] += 1
+
+        if self._attached is None:
+            self._attached = [AttachedDriver(*session) for session in self.sessions]
+
+        return Tab(
+            self._attached[browser],
+            self.browser_locks[browser],
+            self.active_tabs[browser],
+            tab_id,
+        )
+
+    def memory_usage(self):
+        """Resident memory of every browser (including its driver) in bytes."""
+        usage = []
+        for driver in self.drivers:
+            try:
+                process = psutil.Process(driver.service.process.pid)
+                processes = [process] + process.children(recursive=True)
+                usage.append(sum(p.memory_info().rss for p in processes))
+            except psutil.Error:
+                usage.append(0)
+        return usage
+
+    def report(self):
+        rows = [
+            [i + 1, self.num_tabs[i], f"{rss / 2**20:,.0f} MB"]
+            for i, rss in enumerate(self.memory_usage())
+        ]
+        print_table(
+            ["Browser", "Tabs", "Memory"],
+            rows,
+            justifications=["center", "center", "center"],
+        )
+
+    def report_when_ready(self, num_tabs, timeout=120):
+        """Report memory usage once all trackers have opened their tabs."""
+
+        def wait_and_report():
+            for _ in range(timeout):
+                if self.tabs_opened.value >= num_tabs:
+                    break
+                sleep(1)
+            self.report()
+
+        Thread(target=wait_and_report, daemon=True).start()
+
+    def close(self):
+        for driver in self.drivers:
+            driver.quit()
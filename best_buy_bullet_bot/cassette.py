@@ -0,0 +1,260 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+import zlib
+from bisect import bisect_right
+from glob import escape, glob
+from io import BytesIO
+from threading import Lock
+
+from requests import Response
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.exceptions import ConnectionError, RequestException
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# The body is stored decoded so these no longer apply
+_DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+# Trackers in the same process share the cassette
+_LOCK = Lock()
+
+
+def _read_entries(path):
+    """Yield every complete entry of a cassette (or a part of one)."""
+    try:
+        with gzip.open(path, "rt") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return
+    # Parts of processes that were killed can end abruptly
+    except (OSError, EOFError, zlib.error):
+        return
+
+
+class _Writer:
+    """Appends entries to the part of the cassette written by this process."""
+
+    def __init__(self, path):
+        self.file = gzip.open(path, "at")
+        self.lock = Lock()
+        self.bodies = set()
+
+    def write(self, entry, body=None):
+        with self.lock:
+            if body is not None:
+                body_id = hashlib.sha1(body).hexdigest()
+                entry["body"] = body_id
+
+                # Bodies are only stored once since most polls return the same page
+                if body_id not in self.bodies:
+                    self.bodies.add(body_id)
+                    data = {"id": body_id, "data": body.decode("latin-1")}
+                    self.file.write(json.dumps(data) + "\n")
+
+            self.file.write(json.dumps(entry) + "\n")
+
+            # Worker processes are killed rather than closed so write everything right away
+            self.file.flush()
+
+
+class Cassette:
+    """Records the responses trackers receive or plays them back.
+
+    While recording, every request made through `adapter()` is written to a
+    compressed cassette together with its response, timing and headers.
+    While replaying, requests are answered from the cassette with whatever
+    the page looked like at the same point in the recording (sped up by
+    `speed`), so a drop can be rerun deterministically offline.
+
+    Each process records to its own part of the cassette which are merged
+    by `close()`. The cassette can be handed to other processes.
+    """
+
+    def __init__(self, path, replay=False, speed=1):
+        self.path = path
+        self.replay = replay
+        self.speed = speed
+        self.origin = time.time()
+
+        self._pid = None
+        self._writer = None
+        self._requests = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_pid"] = state["_writer"] = state["_requests"] = None
+        return state
+
+    def _part(self):
+        """Writer for this process."""
+        with _LOCK:
+            if self._pid != os.getpid():
+                self._writer = _Writer(f"{self.path}.part-{os.getpid()}")
+                self._pid = os.getpid()
+            return self._writer
+
+    def _load(self):
+        with _LOCK:
+            if self._requests is None:
+                self._requests = self._read()
+            return self._requests
+
+    def _read(self):
+        """Recorded responses grouped by request and sorted by time."""
+        bodies = {}
+        requests = {}
+        for entry in _read_entries(self.path):
+            if "data" in entry:
+                bodies[entry["id"]] = entry["data"].encode("latin-1")
+            else:
+                requests.setdefault((entry["method"], entry["url"]), []).append(entry)
+
+        start = min(
+            (entry["t"] for entries in requests.values() for entry in entries),
+            default=0,
+        )
+        for entries in requests.values():
+            for entry in entries:
+                entry["t"] -= start
+                if "body" in entry:
+                    entry["body"] = bodies[entry["body"]]
+            entries.sort(key=lambda entry: entry["t"])
+
+        return {
+            key: ([entry["t"] for entry in entries], entries)
+            for key, entries in requests.items()
+        }
+
+    def record(self, request, start, elapsed, response=None, error=None):
+        entry = {
+            "t": start,
+            "method": request.method,
+            "url": request.url,
+            "elapsed": elapsed,
+        }
+        if error is not None:
+            entry["error"] = str(error)
+            self._part().write(entry)
+        else:
+            entry["status"] = response.status_code
+            entry["headers"] = {
+                k: v
+                for k, v in response.headers.items()
+                if k.lower() not in _DROPPED_HEADERS
+            }
+            self._part().write(entry, response.content)
+
+    def lookup(self, method, url):
+        """The recorded response to a request made now (None if there isn't one)."""
+        requests = self._load().get((method, url))
+        if requests is None:
+            return None
+
+        # The state of the page at the same point in the recording
+        times, entries = requests
+        offset = (time.time() - self.origin) * self.speed
+        return entries[max(0, bisect_right(times, offset) - 1)]
+
+    def adapter(self, **kwargs):
+        """Transport adapter that records or replays requests."""
+        if self.replay:
+            return ReplayAdapter(self)
+        return RecordingAdapter(self, **kwargs)
+
+    def close(self):
+        """Merge the parts written by every process into the cassette.
+
+        Returns the number of requests that were recorded.
+        """
+        if self.replay:
+            return 0
+
+        parts = glob(f"{escape(self.path)}.part-*")
+        if not parts:
+            # Already merged
+            return 0
+
+        bodies = {}
+        requests = []
+        for part in parts:
+            for entry in _read_entries(part):
+                if "data" in entry:
+                    bodies[entry["id"]] = entry
+                else:
+                    requests.append(entry)
+
+        with gzip.open(self.path, "wt") as f:
+            for entry in bodies.values():
+                f.write(json.dumps(entry) + "\n")
+            for entry in sorted(requests, key=lambda entry: entry["t"]):
+                f.write(json.dumps(entry) + "\n")
+
+        for part in parts:
+            os.remove(part)
+
+        return len(requests)
+
+
+class RecordingAdapter(HTTPAdapter):
+    def __init__(self, cassette, **kwargs):
+        self.cassette = cassette
+        super().__init__(**kwargs)
+
+    def send(self, request, stream=False, **kwargs):
+        start = time.time()
+        try:
+            response = super().send(request, stream=stream, **kwargs)
+        except RequestException as e:
+            self.cassette.record(request, start, time.time() - start, error=e)
+            raise
+
+        # The whole page is downloaded so it can be replayed with any detector.
+        # Callers can still stream it from memory.
+        response.content
+        self.cassette.record(request, start, time.time() - start, response)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    def __init__(self, cassette):
+        self.cassette = cassette
+        super().__init__()
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        entry = self.cassette.lookup(request.method, request.url)
+        if entry is None:
+            raise ConnectionError(
+                f"{request.method} {request.url} is not in the cassette.",
+                request=request,
+            )
+
+        # Take as long as the request did (sped up like everything else)
+        time.sleep(entry["elapsed"] / self.cassette.speed)
+
+        if "error" in entry:
+            raise ConnectionError(entry["error"], request=request)
+
+        response = Response()
+        response.status_code = entry["status"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = BytesIO(entry["body"])
+        response.url = request.url
+        response.request = request
+        response.reason = ""
+        return response
+
+    def close(self):
+        pass
+
+
+def make_adapter(cassette, **kwargs):
+    """Transport adapter for a session that records or replays if a cassette is used."""
+    if cassette is None:
+        return HTTPAdapter(**kwargs)
+    return cassette.adapter(**kwargs)
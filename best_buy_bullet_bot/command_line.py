@@ -57,6 +57,13 @@ setting_utils = ImportWrapper("best_buy_bullet_bot.data.setting_utils")
 url_utils = ImportWrapper("best_buy_bullet_bot.data.url_utils")
 user_data = ImportWrapper("best_buy_bullet_bot.data.user_data")
 browser_login = ImportWrapper("best_buy_bullet_bot.data.browser_login")
+metadata_cache = ImportWrapper("best_buy_bullet_bot.data.metadata_cache")
+detection_latency = ImportWrapper("best_buy_bullet_bot.benchmark.detection_latency")
+startup = ImportWrapper("best_buy_bullet_bot.benchmark.startup")
+parsers = ImportWrapper("best_buy_bullet_bot.benchmark.parsers")
+checkout = ImportWrapper("best_buy_bullet_bot.benchmark.checkout")
+browsers = ImportWrapper("best_buy_bullet_bot.benchmark.browsers")
+soak = ImportWrapper("best_buy_bullet_bot.benchmark.soak")
 
 OPS = {
     "start": [tracker.start, "Start tracking the currently set URLs."],
@@ -75,6 +82,10 @@ OPS = {
         "Tests to make sure all URLs can be tracked. This is also run on startup.",
     ],
     "clear-urls": [url_utils.clear_urls, "Remove all tracked URLs."],
+    "clear-cache": [
+        metadata_cache.clear_cache,
+        "Forget the cached titles, prices and stock of every product.",
+    ],
     "view-settings": [setting_utils.view_settings, "View current settings."],
     "set-funds": [
         setting_utils.set_funds,
@@ -85,11 +96,21 @@ OPS = {
         setting_utils.toggle_auto_checkout,
         "Enable/disable auto checkout.",
     ],
+    "toggle-hybrid-mode": [
+        setting_utils.toggle_hybrid_mode,
+        "Enable/disable hybrid mode, where availability is tracked with get requests and a browser is only launched for checkout \
+            once an item is in stock (only applies if auto-checkout is enabled).",
+    ],
     "change-browser": [
         setting_utils.change_browser,
         "Pick the browser to be used during tracking and auto-checkout (only applies if auto-checkout is enabled). \
             Firefox is the default and recommended browser.",
     ],
+    "compare-browsers": [
+        browsers.compare,
+        "Compare how quickly Chrome and Firefox launch, take the login cookies and find the add-to-cart button on a local \
+            product page, and how much memory each uses. Recommends a browser and the number of threads for your computer.",
+    ],
     "test-sound": [setting_utils.test_sound, "Play sound sample."],
     "set-sound-mode": [
         setting_utils.set_sound_mode,
@@ -99,10 +120,67 @@ OPS = {
         setting_utils.set_threads,
         "Select the number of threads to allocate to tracking each URL.",
     ],
+    "set-workers": [
+        setting_utils.set_workers,
+        "Select the number of worker processes the tracked URLs are split between. Set to 0 to use one worker per physical core.",
+    ],
+    "set-browser-pool": [
+        setting_utils.set_browser_pool,
+        "Select the number of browsers shared by all trackers during auto checkout, with each tracker thread using its own tab. \
+            Set to 0 to launch a browser for every tracker thread.",
+    ],
+    "set-engine": [
+        setting_utils.set_engine,
+        "Choose whether URLs are tracked with one process per URL (multiprocessing) or all from a single event loop (asyncio). \
+            The asyncio engine only applies if auto checkout is disabled.",
+    ],
+    "set-detector": [
+        setting_utils.set_detector,
+        "Choose whether pages are scanned as they download and closed early (stream) or downloaded and parsed in full (soup). \
+            Used to check URLs on startup and for tracking if auto checkout is disabled.",
+    ],
+    "set-browser-detector": [
+        setting_utils.set_browser_detector,
+        "Choose whether browser trackers are notified the moment the add-to-cart button appears (observer) or check for it \
+            at a fixed interval (poll), and set that interval. The poll detector is always used with a browser pool.",
+    ],
+    "set-rate-limit": [
+        setting_utils.set_rate_limit,
+        "Set the most requests per second all trackers can make combined. Regardless of this limit, trackers automatically \
+            slow down when Best Buy responds with 429 or 503 and honor its Retry-After header.",
+    ],
+    "set-metrics": [
+        setting_utils.set_metrics,
+        "Export per-URL tracker metrics (request latency, parse time, poll rate, errors, reconnects and time since the last \
+            successful check) in the Prometheus text format from a local HTTP endpoint and/or a file.",
+    ],
     "count-cores": [
         count_cores,
         "Print how many CPU cores you have and how many threads each core has.",
     ],
+    "benchmark": [
+        detection_latency.benchmark,
+        "Measure how quickly the requests and Selenium trackers detect a restock on a local test server using your current settings.",
+    ],
+    "benchmark-startup": [
+        startup.benchmark,
+        "Check that simple commands like view-urls start up within a fixed time budget without importing the browser.",
+    ],
+    "benchmark-parsers": [
+        parsers.benchmark,
+        "Compare how quickly each parser (html.parser, lxml if installed and the stream scanner) extracts the availability \
+            and title from a corpus of product pages, and check that they all agree.",
+    ],
+    "benchmark-checkout": [
+        checkout.benchmark,
+        "Measure how long each step of auto checkout takes with Chrome and Firefox by checking out on a local stand-in \
+            site (fast-track, continue to payment, cart redirect and password re-prompt). No orders are placed.",
+    ],
+    "soak-test": [
+        soak.soak_test,
+        "Track a growing number of synthetic URLs on a local server with each engine and thread setting to find where \
+            tracking stops scaling. Records polls/s, poll intervals, CPU, memory and file descriptors over time.",
+    ],
     "reset-settings": [
         setting_utils.reset_settings,
         "Reset setting to the defaults.",
@@ -186,6 +264,38 @@ def run_command():
         action="store_true",
         help="force browser to go through traditional login process as opposed to using cookies to skip steps",
     )
+    parser.add_argument(
+        "--trials",
+        type=int,
+        help="number of restocks to simulate (or times to run each command, parse each page or check out, or browsers to launch) when running a benchmark",
+    )
+
+    parser.add_argument(
+        "--record",
+        metavar="CASSETTE",
+        help="record the responses received while tracking to a cassette",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="CASSETTE",
+        help="track using the responses in a cassette instead of Best Buy's website",
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        help="how many times faster than real time a cassette is replayed",
+    )
+
+    parser.add_argument(
+        "--max-urls",
+        type=int,
+        help="most synthetic URLs tracked during a soak test",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        help="seconds each configuration is tracked for during a soak test",
+    )
 
     args = parser.parse_args()
     func_kwargs = FuncKwargs(args)
@@ -194,6 +304,16 @@ def run_command():
     func_kwargs.add_flag("headless", "start")
     func_kwargs.add_flag("verify_account", "start")
     func_kwargs.add_flag("skip_verification", "start")
+    func_kwargs.add_flag("record", "start")
+    func_kwargs.add_flag("replay", "start")
+    func_kwargs.add_flag("replay_speed", "start")
+    func_kwargs.add_flag("trials", "benchmark")
+    func_kwargs.add_flag("trials", "benchmark-startup")
+    func_kwargs.add_flag("trials", "benchmark-parsers")
+    func_kwargs.add_flag("trials", "benchmark-checkout")
+    func_kwargs.add_flag("trials", "compare-browsers")
+    func_kwargs.add_flag("max_urls", "soak-test")
+    func_kwargs.add_flag("duration", "soak-test")
 
     if args.suppress_warnings:
         warnings.filterwarnings("ignore")
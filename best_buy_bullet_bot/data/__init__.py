@@ -1,69 +1,233 @@
-import json
+import atexit
+import mmap
 import os
-import sys
+import struct
 import tempfile
-from glob import glob
+import time
+from threading import Lock
 
-from best_buy_bullet_bot.utils import Colors
+if os.name == "nt":
+    import msvcrt
 
+    def _lock(f):
+        # Retries for 10 seconds before giving up
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
 
-def _read_file():
-    FP.seek(0)
-    return json.load(FP)
+    def _unlock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
 
+else:
+    import fcntl
 
-def _write_file(content):
-    FP.seek(0)
-    FP.write(json.dumps(content))
-    FP.truncate()
+    def _lock(f):
+        fcntl.flock(f, fcntl.LOCK_EX)
 
+    def _unlock(f):
+        fcntl.flock(f, fcntl.LOCK_UN)
 
-# This function is called before killing all processes to
-# make sure the temp file is deleted
-def close_data():
-    FP.close()
-    if num_temp_files == 1 and os.path.isfile(FP.name):
-        os.remove(FP.name)
 
+# Processes started by the bot (directly or indirectly) find the
+# variables of the bot that started them through this variable
+STORE_ENV_VAR = "BEST_BUY_BULLET_BOT_VARS"
 
-# Windows doesn't allow for temporary files to be opened by a subprocess
-# by default so we have to pass a flag to do so
-def temp_opener(name, flag, mode=0o777):
-    return os.open(name, flag | os.O_TEMPORARY, mode)
+_MAGIC = b"3BBOTKV1"
+_HEADER = struct.Struct("<8sQI")  # magic, version, number of variables
+_HEADER_SIZE = 64
+_SLOT = struct.Struct("<32scxH")  # name, type, value length
+_SLOT_SIZE = 320
+_VALUE_SIZE = _SLOT_SIZE - _SLOT.size
+MAX_VARS = 32
 
+# How each type is stored
+_TYPES = {bool: b"?", int: b"q", float: b"d", str: b"s"}
 
-# TODO: Prevent directory from changing based on whether or not we are in root
-temp_dir = os.path.dirname(tempfile.mkdtemp())
+# How many times a read is retried around writes before waiting for the writer
+_READ_RETRIES = 1000
 
-prefix = "best_buy_bullet_bot_global_vars"
-suffix = ".json"
-available_temp_files = glob(os.path.join(temp_dir, f"{prefix}*{suffix}"))
-num_temp_files = len(available_temp_files)
 
+class SharedStore:
+    """A small typed key/value store in a memory-mapped file.
 
-if num_temp_files == 1:
-    # Open the existing temp file
-    FP = open(
-        os.path.join(temp_dir, available_temp_files[0]),
-        "r+",
-        opener=temp_opener if sys.platform == "win32" else None,
-    )
-else:
-    if num_temp_files > 1:
-        # Too many temp files
-        Colors.warn(
-            f"Too many temporary files detected: {available_temp_files}. Deleting all temporary files."
-        )
-        for filename in available_temp_files:
-            os.remove(os.path.join(temp_dir, filename))
+    Every variable has a fixed slot so reading one only unpacks a few bytes.
+    Writes bump a version counter before and after changing a slot (which is
+    odd while a write is in progress) so readers can retry instead of reading
+    a half written value. Writers take a lock file so only one process writes
+    at a time.
+    """
+
+    def __init__(self, path, create=False):
+        self.path = path
+        self.owner = create
+
+        # Each process opens the lock file itself since forked
+        # processes would otherwise share the same lock
+        self._lock_pid = None
+        self._lock_file = None
+        self._thread_lock = Lock()
+
+        size = _HEADER_SIZE + MAX_VARS * _SLOT_SIZE
+        with open(path, "w+b" if create else "r+b") as f:
+            if create:
+                f.truncate(size)
+            self.map = mmap.mmap(f.fileno(), size)
+
+        if create:
+            _HEADER.pack_into(self.map, 0, _MAGIC, 0, 0)
+        elif _HEADER.unpack_from(self.map, 0)[0] != _MAGIC:
+            self.map.close()
+            raise ValueError(f"{path} is not a variable store.")
+
+        self.slots = {}
+        for i in range(self._num_vars()):
+            self.slots[self._name(i)] = i
+
+    def _locked(self, action):
+        """Run `action` while no other thread or process is writing."""
+        if self._lock_pid != os.getpid():
+            self._lock_file = open(f"{self.path}.lock", "a+b")
+            self._thread_lock = Lock()
+            self._lock_pid = os.getpid()
+
+        with self._thread_lock:
+            _lock(self._lock_file)
+            try:
+                return action()
+            finally:
+                _unlock(self._lock_file)
+
+    def _num_vars(self):
+        return _HEADER.unpack_from(self.map, 0)[2]
+
+    def _version(self):
+        return _HEADER.unpack_from(self.map, 0)[1]
+
+    def _set_header(self, version, num_vars):
+        _HEADER.pack_into(self.map, 0, _MAGIC, version, num_vars)
+
+    def _offset(self, slot):
+        return _HEADER_SIZE + slot * _SLOT_SIZE
+
+    def _name(self, slot):
+        name = _SLOT.unpack_from(self.map, self._offset(slot))[0]
+        return name.rstrip(b"\0").decode()
+
+    def names(self):
+        return [self._name(i) for i in range(self._num_vars())]
+
+    def _slot(self, name):
+        # Variables can be created by other processes after we attached
+        if name not in self.slots:
+            self.slots = {self._name(i): i for i in range(self._num_vars())}
+        return self.slots[name]
 
-    # Create a new temp file since we don't have any
-    FP = tempfile.NamedTemporaryFile("r+", prefix=prefix, suffix=suffix, dir=temp_dir)
-    _write_file({})
+    def _read(self, offset):
+        _, type_code, length = _SLOT.unpack_from(self.map, offset)
+        return type_code, self.map[offset + _SLOT.size : offset + _SLOT.size + length]
+
+    def _read_locked(self, offset):
+        # A writer that was killed mid-write leaves the version odd
+        version = self._version()
+        if version % 2:
+            self._set_header(version + 1, self._num_vars())
+        return self._read(offset)
+
+    def get(self, name):
+        offset = self._offset(self._slot(name))
+        for _ in range(_READ_RETRIES):
+            version = self._version()
+            type_code, raw = self._read(offset)
+
+            if version % 2 == 0 and version == self._version():
+                break
+            time.sleep(0)
+        else:
+            # Writes can't be in progress while we hold the lock
+            type_code, raw = self._locked(lambda: self._read_locked(offset))
+
+        if type_code == b"s":
+            return raw.decode()
+        return struct.unpack("<" + type_code.decode(), raw)[0]
+
+    def set(self, name, value):
+        if type(value) not in _TYPES:
+            raise TypeError(f"{type(value).__name__} can't be stored in shared memory.")
+
+        type_code = _TYPES[type(value)]
+        if type_code == b"s":
+            raw = value.encode()
+        else:
+            raw = struct.pack("<" + type_code.decode(), value)
+        if len(raw) > _VALUE_SIZE:
+            raise ValueError(f"The value of {name} is too large to be shared.")
+
+        self._locked(lambda: self._write(name, type_code, raw))
+
+    def _write(self, name, type_code, raw):
+        num_vars = self._num_vars()
+        slot = self.slots.get(name)
+        if slot is None:
+            if name in self.names():
+                slot = self._slot(name)
+            elif num_vars == MAX_VARS:
+                raise ValueError("Too many shared variables.")
+            else:
+                slot = num_vars
+                num_vars += 1
+                self.slots[name] = slot
+
+        offset = self._offset(slot)
+        # Already odd if the last writer was killed mid-write
+        version = self._version() | 1
+        self._set_header(version, self._num_vars())
+        _SLOT.pack_into(self.map, offset, name.encode(), type_code, len(raw))
+        self.map[offset + _SLOT.size : offset + _SLOT.size + len(raw)] = raw
+        self._set_header(version + 1, num_vars)
+
+    def close(self):
+        if not self.map.closed:
+            self.map.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+        if self.owner:
+            for path in [self.path, f"{self.path}.lock"]:
+                if os.path.isfile(path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        # Windows won't delete the file while another process has it open
+                        pass
+
+
+def _attach():
+    """Attach to the store of the bot that started this process or create one."""
+    path = os.environ.get(STORE_ENV_VAR)
+    if path is not None:
+        try:
+            return SharedStore(path), False
+        except (OSError, ValueError):
+            # The bot that set the variable isn't running anymore
+            pass
+
+    fd, path = tempfile.mkstemp(prefix="best_buy_bullet_bot_vars", suffix=".bin")
+    os.close(fd)
+    store = SharedStore(path, create=True)
+
+    # Child processes inherit the environment
+    os.environ[STORE_ENV_VAR] = path
+    atexit.register(store.close)
+    return store, True
+
+
+# This function is called before killing all processes to
+# make sure the store is deleted
+def close_data():
+    STORE.close()
 
 
 class ReferenceVar:
-    """Points to a specific variable in the temp file.
+    """Points to a specific variable in the shared store.
 
     If a variale in changed by one process all other processes
     with that variable will receive that change when trying to
@@ -81,21 +245,19 @@ class ReferenceVar:
         return self() if var_name.endswith("constant") else self
 
     def __call__(self):
-        return _read_file()[self.var_name]
+        return STORE.get(self.var_name)
 
     def update(self, new_value, constant=False):
-        # Update the value of the variable in the temp file
-        updated_dict = _read_file()
-
         new_name = self.var_name
         new_name += "_constant" if constant else ""
-        updated_dict.update({new_name: new_value})
-        _write_file(updated_dict)
+        STORE.set(new_name, new_value)
 
         return new_value if constant else self
 
 
-if num_temp_files != 1:
+STORE, main_process = _attach()
+
+if main_process:
     # We are in the main process. This is where variables are created.
 
     from keyring.util import platform_
@@ -107,12 +269,12 @@ if num_temp_files != 1:
     if not os.path.isdir(shared_dir):
         os.makedirs(shared_dir)
 
-    # Save to temporary file
+    # Save to the shared store
     HEADLESS_WARNED = ReferenceVar("HEADLESS_WARNED").update(False)
     SHARED_DIR = ReferenceVar("SHARED_DIR").update(shared_dir, constant=True)
 else:
     # We are in a separate process. This is where variables are copied over from the main process.
 
-    # Copy over all variables in the temp file to the locals dict so they can be imported
-    for var_name in _read_file():
+    # Copy over all variables in the store to the locals dict so they can be imported
+    for var_name in STORE.names():
         locals()[var_name.replace("_constant", "")] = ReferenceVar(var_name)
@@ -0,0 +1,93 @@
+import json
+import os
+import re
+import time
+from json.decoder import JSONDecodeError
+from threading import Lock
+
+from best_buy_bullet_bot.data import SHARED_DIR
+from best_buy_bullet_bot.detection import PageInfo
+from best_buy_bullet_bot.utils import Colors
+
+CACHE_DIR = os.path.join(SHARED_DIR, "metadata_cache.json")
+
+# How long cached metadata is trusted before it has to be fetched again
+TTL = 6 * 60 * 60
+
+_SKU = re.compile(r"skuId=(\d+)|/(\d+)\.p\b")
+_lock = Lock()
+
+
+def get_sku(url):
+    """The SKU of a product URL (or the URL itself if it doesn't have one)."""
+    match = _SKU.search(url)
+    if match is None:
+        return url
+    return match.group(1) or match.group(2)
+
+
+def _read():
+    try:
+        with open(CACHE_DIR) as f:
+            return json.load(f)
+    except (OSError, JSONDecodeError):
+        return {}
+
+
+def _save(cache):
+    # Replacing the file means a crash can't leave it half written
+    tmp_path = CACHE_DIR + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, CACHE_DIR)
+
+
+def _get(url, *fields, timestamp):
+    entry = _read().get(get_sku(url))
+    if entry is None or time.time() - entry.get(timestamp, 0) > TTL:
+        return None
+    return [entry[field] for field in fields]
+
+
+def _update(url, timestamp, **fields):
+    with _lock:
+        cache = _read()
+        entry = cache.setdefault(get_sku(url), {})
+        entry.update(fields)
+        entry[timestamp] = time.time()
+
+        # Drop products that haven't been seen in a while
+        now = time.time()
+        cache = {
+            sku: entry
+            for sku, entry in cache.items()
+            if now - max(entry.get("fetched", 0), entry.get("price_fetched", 0)) <= TTL
+        }
+        _save(cache)
+
+
+def get_page(url):
+    """Cached title and stock state of a product (None if expired)."""
+    values = _get(url, "available", "title", timestamp="fetched")
+    return None if values is None else PageInfo(*values)
+
+
+def save_page(url, page):
+    _update(url, "fetched", available=page.available, title=page.title)
+
+
+def get_price(url):
+    """Cached price of a product (None if expired)."""
+    values = _get(url, "price", timestamp="price_fetched")
+    return None if values is None else values[0]
+
+
+def save_price(url, price):
+    _update(url, "price_fetched", price=price)
+
+
+def clear_cache():
+    with _lock:
+        if os.path.isfile(CACHE_DIR):
+            os.remove(CACHE_DIR)
+    Colors.print("Successfully cleared the product cache!", properties=["success"])
@@ -3,16 +3,10 @@ import logging
 import os.path
 import shutil
 import sys
-from time import sleep
+from importlib import import_module
+from json.decoder import JSONDecodeError
+from time import sleep, time
 
-from selenium.common.exceptions import WebDriverException
-from selenium.webdriver import Chrome, Firefox
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.firefox.options import Options as FirefoxOptions
-from webdriver_manager.chrome import ChromeDriverManager
-from webdriver_manager.firefox import GeckoDriverManager
-
-from best_buy_bullet_bot.audio import sound_effects
 from best_buy_bullet_bot.data import HEADLESS_WARNED, SHARED_DIR
 from best_buy_bullet_bot.utils import (
     Colors,
@@ -24,15 +18,30 @@ from best_buy_bullet_bot.utils import (
 )
 
 SETTINGS_DIR = os.path.join(SHARED_DIR, "settings.json")
+DRIVERS_DIR = os.path.join(SHARED_DIR, "drivers.json")
 SOUND_MODES = ["disabled", "single", "repeat"]
+ENGINES = ["multiprocessing", "asyncio"]
+DETECTOR_NAMES = ["stream", "soup"]
+BROWSER_DETECTOR_NAMES = ["observer", "poll"]
 DEFAULT_SETTINGS = {
     "funds": 1000,
     "tax": 0.095,
     "auto checkout": True,
+    "hybrid mode": False,
     "account verification": True,
     "browser": "firefox",
     "sound mode": SOUND_MODES[2],
     "threads": 1,
+    "workers": 0,
+    "engine": ENGINES[0],
+    "detector": DETECTOR_NAMES[0],
+    "browser detector": BROWSER_DETECTOR_NAMES[0],
+    "poll interval": 0.5,
+    "browser pool": 0,
+    "max requests per second": 0,
+    "metrics port": 0,
+    "metrics file": "",
+    "user agents": {},
 }
 
 
@@ -82,15 +91,25 @@ def view_settings(show_default=False):
     settings["funds"] = f"${settings['funds']:,.2f}"
     settings["tax"] = f"{settings['tax'] * 100:.2f}%"
     settings["browser"] = settings["browser"].title()
+    settings["workers"] = settings["workers"] or "One per core"
+    settings["max requests per second"] = (
+        settings["max requests per second"] or "Unlimited"
+    )
+    settings["metrics port"] = settings["metrics port"] or "Disabled"
+    settings["metrics file"] = settings["metrics file"] or "Disabled"
+    settings["poll interval"] = f"{settings['poll interval'] * 1000:,.0f} ms"
 
-    # Hidden property
+    # Hidden properties
     del settings["account verification"]
+    del settings["user agents"]
 
     rows = [[k.title(), v] for k, v in settings.items()]
     print_table(["Property", "Value"], rows)
 
 
 def set_funds():
+    from best_buy_bullet_bot.funds import discard_journals
+
     while True:
         funds = input("Allotted money: $")
         funds = validate_num(funds.replace("$", ""), float)
@@ -102,6 +121,8 @@ def set_funds():
         else:
             break
 
+    # Purchases from before the funds were set no longer apply
+    discard_journals()
     update_setting("funds", funds)
     Colors.print(f"Successfully set funds to ${funds:,.2f}!", properties=["success"])
 
@@ -132,9 +153,6 @@ class MoneyManager:
     def check_funds(self, cost):
         return CURRENT_SETTINGS["funds"] - cost >= 0
 
-    def make_purchase(self, cost):
-        update_setting("funds", CURRENT_SETTINGS["funds"] - cost)
-
 
 def _toggle_setting(setting_name):
     update_setting(setting_name, not CURRENT_SETTINGS[setting_name])
@@ -148,17 +166,130 @@ def toggle_auto_checkout():
     _toggle_setting("auto checkout")
 
 
+def toggle_hybrid_mode():
+    _toggle_setting("hybrid mode")
+
+
+# Major versions of webdriver_manager whose (private) driver classes can tell
+# the version of the installed browser
+BROWSER_VERSION_MANAGERS = [3, 4]
+
+# How long a driver is used without checking for a newer one when the version
+# of the browser can't be found
+DRIVER_REFRESH_INTERVAL = 24 * 60 * 60
+
+
+def _manager_major_version():
+    import webdriver_manager
+
+    try:
+        return int(getattr(webdriver_manager, "__version__", "").split(".")[0])
+    except ValueError:
+        return None
+
+
+def _browser_version(manager):
+    """Version of the installed browser (None if it can't be found).
+
+    The method that finds it isn't public and differs between versions of
+    webdriver_manager so it is only looked for in the versions it is known to be in.
+    """
+    if _manager_major_version() not in BROWSER_VERSION_MANAGERS:
+        return None
+
+    for name in ["get_browser_version_from_os", "get_browser_version"]:
+        method = getattr(manager.driver, name, None)
+        if method is not None:
+            try:
+                return method()
+            except Exception:
+                return None
+    return getattr(manager.driver, "browser_version", None)
+
+
+def _read_drivers():
+    try:
+        with open(DRIVERS_DIR) as f:
+            return json.load(f)
+    except (OSError, JSONDecodeError):
+        return {}
+
+
 class DriverClassWrapper:
-    def __init__(self, driver, manager, options):
-        self.driver = driver
-        self.manager = manager
-        self.options = options
+    """The Selenium classes of a browser.
+
+    Selenium and webdriver_manager are slow to import so the classes are only
+    imported the first time they are used.
+    """
+
+    def __init__(self, name, driver, manager, options):
+        self.name = name
+        self._paths = {"driver": driver, "manager": manager, "options": options}
+        self._driver_path = None
+        self._browser_version = None
+
+    def __getattr__(self, attr):
+        if attr.startswith("_") or attr not in self._paths:
+            raise AttributeError(attr)
+
+        module, class_name = self._paths[attr].rsplit(".", 1)
+        value = getattr(import_module(module), class_name)
+        setattr(self, attr, value)
+        return value
+
+    def browser_version(self, manager=None):
+        """Version of the installed browser (None if it can't be found)."""
+        if self._browser_version is None:
+            self._browser_version = _browser_version(manager or self.manager())
+        return self._browser_version
+
+    def install(self):
+        """Path to the driver, installing it if necessary.
+
+        webdriver_manager goes online to look for a newer driver every time
+        it is asked, so the path is cached on disk along with the version of
+        the browser it was installed for and only looked up again once the
+        browser updates. If the version of the browser can't be found the
+        path is looked up again every `DRIVER_REFRESH_INTERVAL` instead.
+        """
+        if self._driver_path is not None:
+            return self._driver_path
+
+        manager = self.manager()
+        version = self.browser_version(manager)
+
+        drivers = _read_drivers()
+        cached = drivers.get(self.name, {})
+        if os.path.isfile(cached.get("path", "")) and (
+            cached.get("version") == version
+            if version is not None
+            else time() - cached.get("installed", 0) < DRIVER_REFRESH_INTERVAL
+        ):
+            path = cached["path"]
+        else:
+            path = manager.install()
+            drivers[self.name] = {"version": version, "path": path, "installed": time()}
+            with open(DRIVERS_DIR, "w+") as f:
+                json.dump(drivers, f)
+
+        self._driver_path = path
+        return path
 
 
 logging.disable(logging.WARNING)
 DRIVER_NAMES = {
-    "chrome": DriverClassWrapper(Chrome, ChromeDriverManager, ChromeOptions),
-    "firefox": DriverClassWrapper(Firefox, GeckoDriverManager, FirefoxOptions),
+    "chrome": DriverClassWrapper(
+        "chrome",
+        "selenium.webdriver.Chrome",
+        "webdriver_manager.chrome.ChromeDriverManager",
+        "selenium.webdriver.chrome.options.Options",
+    ),
+    "firefox": DriverClassWrapper(
+        "firefox",
+        "selenium.webdriver.Firefox",
+        "webdriver_manager.firefox.GeckoDriverManager",
+        "selenium.webdriver.firefox.options.Options",
+    ),
 }
 
 
@@ -177,6 +308,8 @@ def is_installed(browser_name):
             f"3B Bot does not support {browser_name.title()}. Please pick either Chrome or Firefox."
         )
 
+    from selenium.common.exceptions import WebDriverException
+
     # Install the drivers
     try:
         manager = wrap.manager()
@@ -243,6 +376,8 @@ def change_browser():
 
 
 def test_sound(repetitions=3, print_info=True):
+    from best_buy_bullet_bot.audio import sound_effects
+
     if print_info:
         print("Playing sound...")
         sleep(0.15)
@@ -307,6 +442,183 @@ def set_threads():
     )
 
 
+def set_workers():
+    while True:
+        workers = input("Worker processes (0 for one per physical core): ")
+        workers = validate_num(workers, int)
+        if workers is None or workers < 0:
+            Colors.print(
+                "Invalid number of workers. Please enter an integer greater than or equal to 0.",
+                properties=["fail"],
+            )
+        else:
+            break
+
+    update_setting("workers", workers)
+    Colors.print(
+        f"URLs will now be split between {workers} worker processes!"
+        if workers
+        else "URLs will now be split between one worker process per physical core!",
+        properties=["success"],
+    )
+
+
+def set_browser_pool():
+    while True:
+        browsers = input("Shared browsers (0 for one browser per thread): ")
+        browsers = validate_num(browsers, int)
+        if browsers is None or browsers < 0:
+            Colors.print(
+                "Invalid number of browsers. Please enter an integer greater than or equal to 0.",
+                properties=["fail"],
+            )
+        else:
+            break
+
+    update_setting("browser pool", browsers)
+    Colors.print(
+        f"Trackers will now share {browsers} browsers!"
+        if browsers
+        else "Each tracker thread will now launch its own browser!",
+        properties=["success"],
+    )
+
+
+def set_engine():
+    while True:
+        engine = input(f"Select a tracking engine ({ENGINES[0]}/{ENGINES[1]}): ")
+        engine = engine.strip().lower()
+        if engine not in ENGINES:
+            Colors.print(
+                f'Invalid input for engine. Please enter either "{ENGINES[0]}" (one process per URL)'
+                f' or "{ENGINES[1]}" (every URL is tracked from a single process).',
+                properties=["fail"],
+            )
+        else:
+            break
+
+    update_setting("engine", engine)
+    Colors.print(f"Successfully set engine to {engine}!", properties=["success"])
+
+    if engine == ENGINES[1] and CURRENT_SETTINGS["auto checkout"]:
+        Colors.warn(
+            f"The {ENGINES[1]} engine is only used when auto checkout is disabled."
+        )
+
+
+def set_detector():
+    while True:
+        detector = input(
+            f"Select an availability detector ({DETECTOR_NAMES[0]}/{DETECTOR_NAMES[1]}): "
+        )
+        detector = detector.strip().lower()
+        if detector not in DETECTOR_NAMES:
+            Colors.print(
+                f'Invalid input for detector. Please enter either "{DETECTOR_NAMES[0]}" (scans pages as they download)'
+                f' or "{DETECTOR_NAMES[1]}" (downloads and parses entire pages).',
+                properties=["fail"],
+            )
+        else:
+            break
+
+    update_setting("detector", detector)
+    Colors.print(f"Successfully set detector to {detector}!", properties=["success"])
+
+
+def set_browser_detector():
+    while True:
+        detector = input(
+            f"Select a browser detector ({BROWSER_DETECTOR_NAMES[0]}/{BROWSER_DETECTOR_NAMES[1]}): "
+        )
+        detector = detector.strip().lower()
+        if detector not in BROWSER_DETECTOR_NAMES:
+            Colors.print(
+                f'Invalid input for detector. Please enter either "{BROWSER_DETECTOR_NAMES[0]}" (notified the moment the button appears)'
+                f' or "{BROWSER_DETECTOR_NAMES[1]}" (checks for the button at a fixed interval).',
+                properties=["fail"],
+            )
+        else:
+            break
+
+    while True:
+        interval = input("Poll interval in seconds (used by the poll detector): ")
+        interval = validate_num(interval, float)
+        if interval is None or interval <= 0:
+            Colors.print(
+                "Invalid input. Please enter a number greater than 0.",
+                properties=["fail"],
+            )
+        else:
+            break
+
+    update_setting("browser detector", detector)
+    update_setting("poll interval", interval)
+    Colors.print(
+        f"Successfully set browser detector to {detector}!", properties=["success"]
+    )
+
+
+def set_rate_limit():
+    while True:
+        rps = input("Max requests per second across all trackers (0 for no limit): ")
+        rps = validate_num(rps, float)
+        if rps is None or rps < 0:
+            Colors.print(
+                "Invalid input. Please enter a number greater than or equal to 0.",
+                properties=["fail"],
+            )
+        else:
+            break
+
+    update_setting("max requests per second", rps)
+    Colors.print(
+        f"Trackers will make at most {rps:g} requests per second!"
+        if rps
+        else "Trackers will only slow down when Best Buy asks them to!",
+        properties=["success"],
+    )
+
+
+def set_metrics():
+    while True:
+        port = input("Metrics port (0 to disable): ")
+        port = validate_num(port, int)
+        if port is None or not 0 <= port <= 65535:
+            Colors.print(
+                "Invalid port. Please enter an integer between 0 and 65535.",
+                properties=["fail"],
+            )
+        else:
+            break
+
+    while True:
+        path = input("Metrics file (leave blank to disable): ").strip()
+        if path:
+            path = os.path.abspath(os.path.expanduser(path))
+        if path and not os.path.isdir(os.path.dirname(path)):
+            Colors.print(
+                f"{os.path.dirname(path)} does not exist. Please enter a file in an existing directory.",
+                properties=["fail"],
+            )
+        else:
+            break
+
+    update_setting("metrics port", port)
+    update_setting("metrics file", path)
+
+    if port or path:
+        Colors.print(
+            "Tracker metrics will be exported"
+            + (f" at http://127.0.0.1:{port}/metrics" if port else "")
+            + (" and" if port and path else "")
+            + (f" to {path}" if path else "")
+            + "!",
+            properties=["success"],
+        )
+    else:
+        Colors.print("Metrics exporting disabled!", properties=["success"])
+
+
 def reset_settings():
     print("Default settings:")
     view_settings(show_default=True)
@@ -1,14 +1,17 @@
 import json
 import os.path
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 
-from bs4 import BeautifulSoup
 from requests import Session
-from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 from requests.packages.urllib3.util.retry import Retry
 
-from best_buy_bullet_bot.browser import get_user_agent
-from best_buy_bullet_bot.data import SHARED_DIR
+from best_buy_bullet_bot.cassette import make_adapter
+from best_buy_bullet_bot.data import SHARED_DIR, metadata_cache
+from best_buy_bullet_bot.data.setting_utils import get_settings
+from best_buy_bullet_bot.detection import fetch_page
+from best_buy_bullet_bot.rate_control import RateController
 from best_buy_bullet_bot.utils import (
     Colors,
     loading,
@@ -18,6 +21,15 @@ from best_buy_bullet_bot.utils import (
 )
 
 URL_DIR = os.path.join(SHARED_DIR, "urls.json")
+SETTINGS = get_settings()
+DETECTOR = SETTINGS["detector"]
+MAX_RPS = SETTINGS["max requests per second"]
+
+# Number of times a URL is retried after Best Buy asks us to slow down
+THROTTLED_RETRIES = 3
+
+# Number of URLs that are looked up at the same time
+LOOKUP_WORKERS = 8
 
 
 def _read():
@@ -153,57 +165,151 @@ def remove_url():
     )
 
 
-def get_url_titles():
-    flattened_urls = [
-        url
-        for url_group, _ in get_url_data()
-        for url in (url_group if type(url_group) is list else [url_group])
-    ]
+def _fetch_title(session, url, rate_controller):
+    for attempt in range(THROTTLED_RETRIES + 1):
+        time.sleep(rate_controller.acquire(url))
+        try:
+            page = fetch_page(session, url, DETECTOR, need_title=True, timeout=10)
+            if page.title is not None:
+                metadata_cache.save_page(url, page)
+            return page
+        except RequestException as e:
+            response = e.response
+            if (
+                attempt == THROTTLED_RETRIES
+                or response is None
+                or not rate_controller.throttle(
+                    url, response.status_code, response.headers
+                )
+            ):
+                raise
+
+
+def lookup_urls(urls, max_workers=LOOKUP_WORKERS, use_cache=True, cassette=None):
+    """Start looking up the title and availability of every URL.
+
+    Lookups run concurrently in the background. Returns a future for each
+    URL (in the same order) that resolves to its `PageInfo`. Products that
+    were looked up recently resolve straight away from the cache and are
+    refreshed in the background. Lookups are recorded or replayed if a
+    `Cassette` is given.
+    """
+    # Importing the browser module is slow so it is only done when needed
+    from best_buy_bullet_bot.browser import get_user_agent
+
+    max_workers = max(1, min(max_workers, len(urls)))
 
     session = Session()
     session.headers.update({"user-agent": get_user_agent()})
+    # Throttling responses are left to the rate controller
     retry = Retry(
         connect=3,
         backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
+        status_forcelist=[500, 502, 504],
         method_whitelist=["HEAD", "GET", "OPTIONS"],
+        respect_retry_after_header=False,
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = make_adapter(cassette, max_retries=retry, pool_maxsize=max_workers)
     session.mount("https://", adapter)
     session.mount("http://", adapter)
 
-    for url in flattened_urls:
-        try:
-            response = session.get(url, timeout=10)
-        except RequestException as e:
-            Colors.print(e, properties=["fail", "bold"])
-            continue
+    rate_controller = RateController(urls, MAX_RPS)
 
-        soup = BeautifulSoup(response.text, "html.parser")
+    executor = ThreadPoolExecutor(max_workers)
+    lookups = [
+        executor.submit(_fetch_title, session, url, rate_controller) for url in urls
+    ]
 
-        raw_title = soup.find("div", class_="sku-title")
-        if raw_title is None:
-            Colors.print(
-                f"Unable to find title for {url}.", properties=["fail", "bold"]
-            )
-            continue
-        title = raw_title.get_text().strip()
+    # Submitted last so it only runs once every lookup has started
+    def close_session():
+        wait(lookups)
+        session.close()
+
+    executor.submit(close_session)
+    executor.shutdown(wait=False)
 
-        in_stock = soup.find(
-            "button",
-            {"data-button-state": "ADD_TO_CART"},
+    if not use_cache:
+        return lookups
+
+    futures = []
+    for url, lookup in zip(urls, lookups):
+        page = metadata_cache.get_page(url)
+        if page is None:
+            futures.append(lookup)
+        else:
+            cached = Future()
+            cached.set_result(page)
+            # The stock in the cache can be out of date
+            cached.refresh = lookup
+            futures.append(cached)
+    return futures
+
+
+def _still_available(future):
+    """Confirm that a product the cache says is in stock still is."""
+    refresh = getattr(future, "refresh", None)
+    if refresh is None:
+        return True
+
+    try:
+        return refresh.result().available
+    # The cached title is still good even if the refresh failed
+    except Exception:
+        return False
+
+
+def check_lookup(url, future):
+    """Wait for a lookup to finish and return the title or an error message."""
+    try:
+        page = future.result()
+    # Pages that can't be fetched or parsed are reported rather than ending startup
+    except Exception as e:
+        return None, f"{url}: {e}"
+
+    if page.title is None:
+        return None, f"Unable to find title for {url}."
+
+    if page.available and _still_available(future):
+        Colors.warn(f"{page.title} is already in stock.")
+
+    return page.title, None
+
+
+def report_failures(errors):
+    if errors:
+        Colors.print(
+            f"Unable to check {len(errors)} URL{'s' if len(errors) > 1 else ''}:",
+            *errors,
+            sep="\n",
+            properties=["fail", "bold"],
         )
-        if in_stock:
-            Colors.warn(f"{title} is already in stock.")
 
-        yield title
 
-    session.close()
+def get_url_titles(use_cache=True, cassette=None):
+    """Yield the title of every URL that could be checked in order."""
+    urls = [
+        url
+        for url_group, _ in get_url_data()
+        for url in (url_group if type(url_group) is list else [url_group])
+    ]
+
+    errors = []
+    for url, future in zip(
+        urls, lookup_urls(urls, use_cache=use_cache, cassette=cassette)
+    ):
+        title, error = check_lookup(url, future)
+        if title is None:
+            errors.append(error)
+        else:
+            yield title
+
+    # Report every failure at once so they don't get lost between titles
+    report_failures(errors)
 
 
 def test_urls():
     with loading("Testing URLs"):
-        for title in get_url_titles():
+        for title in get_url_titles(use_cache=False):
             Colors.print(f"Confirmed {title}!", properties=["success"])
 
 
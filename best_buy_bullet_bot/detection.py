@@ -0,0 +1,166 @@
+import html
+import re
+import time
+from collections import namedtuple
+
+CHUNK_SIZE = 16 * 1024
+
+# `parse_time` is the time spent scanning the page once it was downloaded
+PageInfo = namedtuple("PageInfo", ["available", "title", "parse_time"], defaults=[0.0])
+
+# The element holding the product's add-to-cart button (the same class
+# shows up in stylesheets and on the buttons of accessories)
+_FULFILLMENT = re.compile(
+    rb'<[a-zA-Z][^<>]*\bclass="[^"]*\bfulfillment-add-to-cart-button\b[^"]*"[^<>]*>'
+)
+_BUTTON_STATE = re.compile(rb'<button\b[^<>]*\bdata-button-state="([^"]*)"[^<>]*>')
+_TITLE = re.compile(rb'<div[^>]*\bclass="[^"]*\bsku-title\b[^"]*"[^>]*>')
+_DIV = re.compile(rb"<(/?)div\b[^<>]*>")
+_TAG = re.compile(rb"<[^>]+>")
+
+# Number of bytes that are searched again when a new chunk arrives
+# so we can find matches that were split between two chunks
+_OVERLAP = 512
+
+
+def parse_page(page, need_title=False, parser="html.parser"):
+    # BeautifulSoup is slow to import and rarely needed by the stream scanner
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page, parser)
+
+    # Look for the product's add-to-cart button
+    fulfillment = soup.find(class_="fulfillment-add-to-cart-button")
+    button = (
+        None
+        if fulfillment is None
+        else fulfillment.find("button", {"data-button-state": True})
+    )
+    available = button is not None and button["data-button-state"] == "ADD_TO_CART"
+
+    title = None
+    if need_title:
+        raw_title = soup.find("div", class_="sku-title")
+        if raw_title is not None:
+            title = raw_title.get_text().strip()
+
+    return PageInfo(available, title)
+
+
+class SoupScanner:
+    """Buffers the entire page and parses it with BeautifulSoup."""
+
+    def __init__(self, need_title=False):
+        self.need_title = need_title
+        self.buffer = bytearray()
+
+    def feed(self, chunk):
+        """Returns True once the scanner doesn't need any more data."""
+        self.buffer += chunk
+        return False
+
+    def result(self):
+        return parse_page(bytes(self.buffer), self.need_title)
+
+
+class StreamScanner(SoupScanner):
+    """Scans the raw page as it arrives.
+
+    Stops as soon as the state of the fulfillment button (and the title
+    if it was requested) is found, which means we rarely have to download
+    or parse more than a fraction of the page. If the page ends before
+    they are found we fall back to BeautifulSoup.
+    """
+
+    def __init__(self, need_title=False):
+        super().__init__(need_title)
+        self.available = None
+        self.title = None
+
+        self._button_pos = 0
+        self._button_found = False
+        self._title_pos = 0
+        self._title_start = None
+        self._title_depth = 1
+
+    def _scan_button(self):
+        if not self._button_found:
+            match = _FULFILLMENT.search(self.buffer, self._button_pos)
+            if match is None:
+                self._button_pos = max(0, len(self.buffer) - _OVERLAP)
+                return
+            self._button_found = True
+            self._button_pos = match.end()
+
+        match = _BUTTON_STATE.search(self.buffer, self._button_pos)
+        if match is None:
+            self._button_pos = max(self._button_pos, len(self.buffer) - _OVERLAP)
+        else:
+            self.available = match.group(1) == b"ADD_TO_CART"
+
+    def _scan_title(self):
+        if self._title_start is None:
+            match = _TITLE.search(self.buffer, self._title_pos)
+            if match is None:
+                self._title_pos = max(0, len(self.buffer) - _OVERLAP)
+                return
+            self._title_start = self._title_pos = match.end()
+
+        # The title ends where its div is closed (it can contain other divs)
+        for match in _DIV.finditer(self.buffer, self._title_pos):
+            self._title_pos = match.end()
+            self._title_depth += -1 if match.group(1) else 1
+            if not self._title_depth:
+                raw_title = _TAG.sub(
+                    b"", self.buffer[self._title_start : match.start()]
+                )
+                self.title = html.unescape(raw_title.decode(errors="replace")).strip()
+                return
+
+    def _resolved(self):
+        return self.available is not None and (
+            not self.need_title or self.title is not None
+        )
+
+    def feed(self, chunk):
+        self.buffer += chunk
+
+        if self.available is None:
+            self._scan_button()
+        if self.need_title and self.title is None:
+            self._scan_title()
+
+        return self._resolved()
+
+    def result(self):
+        if self._resolved():
+            return PageInfo(self.available, self.title)
+        return super().result()
+
+
+DETECTORS = {"stream": StreamScanner, "soup": SoupScanner}
+
+
+def fetch_page(session, url, detector, need_title=False, **kwargs):
+    """Make a get request and scan the response for the product's availability.
+
+    The connection is closed as soon as the detector has what it needs.
+    """
+    scanner = DETECTORS[detector](need_title)
+    response = session.get(url, stream=True, **kwargs)
+    parse_time = 0
+
+    try:
+        response.raise_for_status()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            start = time.perf_counter()
+            done = scanner.feed(chunk)
+            parse_time += time.perf_counter() - start
+            if done:
+                break
+    finally:
+        response.close()
+
+    start = time.perf_counter()
+    page = scanner.result()
+    return page._replace(parse_time=parse_time + time.perf_counter() - start)
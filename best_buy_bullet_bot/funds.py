@@ -0,0 +1,223 @@
+import ctypes
+import json
+import multiprocessing as mp
+import os
+from glob import escape, glob
+
+import psutil
+
+from best_buy_bullet_bot.data import SHARED_DIR
+from best_buy_bullet_bot.data.setting_utils import (
+    SETTINGS_DIR,
+    get_settings,
+    update_setting,
+)
+
+JOURNAL_DIR = os.path.join(SHARED_DIR, "funds_journals")
+
+# Most checkouts that can be holding on to funds at the same time
+MAX_RESERVATIONS = 64
+
+
+def _read_journal(path):
+    """Yield every complete entry of a journal."""
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # The last line can be cut short by a crash
+                    pass
+    except OSError:
+        pass
+
+
+def journal_path():
+    """Journal for the purchases of this run.
+
+    Every run has its own journal so bots running at the same time can't
+    overwrite each other's purchases.
+    """
+    return os.path.join(JOURNAL_DIR, f"{os.getpid()}.jsonl")
+
+
+def _running(header):
+    """Whether the run that started a journal is still going."""
+    try:
+        return psutil.Process(header["pid"]).create_time() == header["started"]
+    except (KeyError, TypeError, psutil.Error):
+        return False
+
+
+def _finished_journals():
+    """Journals of runs that have stopped (e.g. crashed) without saving them."""
+    for path in glob(os.path.join(escape(JOURNAL_DIR), "*.jsonl")):
+        if not _running(next(_read_journal(path), None)):
+            yield path
+
+
+def _saved_funds():
+    # Other bots may have saved their purchases since the settings were loaded
+    try:
+        with open(SETTINGS_DIR) as f:
+            return json.load(f)["funds"]
+    except (OSError, ValueError, KeyError):
+        return get_settings()["funds"]
+
+
+def _fold(path):
+    """Deduct the purchases of a journal from the funds and remove it."""
+    spent = sum(entry["cost"] for entry in _read_journal(path) if "cost" in entry)
+    if spent:
+        update_setting("funds", _saved_funds() - spent)
+    os.remove(path)
+
+
+def recover_funds():
+    """Apply purchases that were journaled but never saved to the settings.
+
+    Returns the funds after recovering.
+    """
+    for path in _finished_journals():
+        _fold(path)
+    return get_settings()["funds"]
+
+
+def discard_journals():
+    """Forget purchases that were never saved (e.g. once the user sets new funds)."""
+    for path in _finished_journals():
+        os.remove(path)
+
+
+class FundsLedger:
+    """Keeps track of the funds shared by every checkout.
+
+    A checkout reserves the funds it expects to need when the item is found
+    in stock, then either commits the reservation once the order is placed or
+    releases it if the checkout fails. Reserving and committing are atomic,
+    so simultaneous checkouts can't spend the same money twice.
+
+    Purchases are written to a journal as soon as they are committed. The
+    journal is folded back into the settings by `close()` or by
+    `recover_funds()` the next time the bot starts (e.g. after a crash).
+
+    The ledger lives in shared memory and can only be handed to a process
+    when it is created (e.g. as a `Pool` initializer argument).
+    """
+
+    def __init__(self, funds, journal=None):
+        self.journal = journal
+        self.lock = mp.Lock()
+        self.balance = mp.RawValue(ctypes.c_double, funds)
+        self.reserved = mp.RawValue(ctypes.c_double, 0)
+        self.seq = mp.RawValue(ctypes.c_ulonglong, 0)
+
+        # A reservation is a slot and the generation of the slot when it was
+        # taken so a stale reservation can't release someone else's funds
+        self.amounts = mp.RawArray(ctypes.c_double, MAX_RESERVATIONS)
+        self.active = mp.RawArray(ctypes.c_bool, MAX_RESERVATIONS)
+        self.generations = mp.RawArray(ctypes.c_ulonglong, MAX_RESERVATIONS)
+
+        # Only the process that created the ledger saves it
+        self._owner = os.getpid()
+
+        if journal is not None:
+            os.makedirs(os.path.dirname(journal), exist_ok=True)
+
+            # The run the journal belongs to. The journal only shows up once it
+            # has been written so it can't be mistaken for one of a finished run.
+            header = {"pid": self._owner, "started": psutil.Process().create_time()}
+            with open(f"{journal}.tmp", "w") as f:
+                f.write(json.dumps(header) + "\n")
+            os.replace(f"{journal}.tmp", journal)
+
+    def get_funds(self):
+        return self.balance.value
+
+    def check_funds(self, cost):
+        """Whether the funds cover the cost (ignoring reservations)."""
+        return self.balance.value - cost >= 0
+
+    def available(self):
+        return self.balance.value - self.reserved.value
+
+    def reserve(self, cost):
+        """Hold on to funds for a checkout.
+
+        Returns the reservation or None if there aren't enough funds.
+        """
+        with self.lock:
+            if self.available() - cost < 0 or all(self.active):
+                return None
+
+            slot = list(self.active).index(False)
+            self.active[slot] = True
+            self.amounts[slot] = cost
+            self.generations[slot] += 1
+            self.reserved.value += cost
+            return slot, self.generations[slot]
+
+    def _held(self, reservation):
+        slot, generation = reservation
+        return self.active[slot] and self.generations[slot] == generation
+
+    def adjust(self, reservation, cost):
+        """Change the amount held by a reservation (e.g. to the grand total).
+
+        Returns False if there aren't enough funds for the new amount.
+        """
+        slot, _ = reservation
+        with self.lock:
+            if not self._held(reservation):
+                return False
+
+            extra = cost - self.amounts[slot]
+            if self.available() - extra < 0:
+                return False
+
+            self.amounts[slot] = cost
+            self.reserved.value += extra
+            return True
+
+    def commit(self, reservation):
+        """Spend the funds held by a reservation."""
+        slot, _ = reservation
+        with self.lock:
+            if not self._held(reservation):
+                return
+
+            cost = self.amounts[slot]
+            self.active[slot] = False
+            self.reserved.value -= cost
+            self.balance.value -= cost
+            self.seq.value += 1
+            entry = {"seq": self.seq.value, "cost": cost, "balance": self.balance.value}
+
+        self._write(entry)
+
+    def release(self, reservation):
+        """Give back the funds held by a reservation (does nothing once committed)."""
+        slot, _ = reservation
+        with self.lock:
+            if self._held(reservation):
+                self.active[slot] = False
+                self.reserved.value -= self.amounts[slot]
+
+    def _write(self, entry):
+        if self.journal is None:
+            return
+
+        # The order has already been placed so this isn't worth deferring
+        with open(self.journal, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        """Save the purchases to the settings and remove the journal."""
+        if self.journal is None or os.getpid() != self._owner:
+            return
+
+        if os.path.isfile(self.journal):
+            _fold(self.journal)
@@ -0,0 +1,163 @@
+import ctypes
+import math
+import multiprocessing as mp
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+# Responses that mean we are sending requests too quickly
+THROTTLE_STATUSES = [429, 503]
+
+MIN_RATE = 0.2  # requests per second
+DECREASE_FACTOR = 0.5
+INCREASE_STEP = 1  # requests per second gained every second without throttling
+MAX_RETRY_AFTER = 300
+
+# Averages the time between requests to a host
+_SMOOTHING = 0.1
+
+
+def parse_retry_after(value):
+    """Seconds to wait according to a Retry-After header (0 if invalid)."""
+    if not value:
+        return 0
+
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return 0
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        seconds = (date - datetime.now(timezone.utc)).total_seconds()
+
+    return min(max(seconds, 0), MAX_RETRY_AFTER)
+
+
+class RateController:
+    """Adapts the request rate to each host based on the signals it sends back.
+
+    Requests are spaced out so they never exceed the current limit of their
+    host or the global ceiling. A 429 or 503 response halves the limit of the
+    host and pauses it for as long as Retry-After asks, after which the limit
+    climbs back up by a fixed step every second. Hosts are unlimited (apart
+    from the ceiling) until they throttle us.
+
+    The controller lives in shared memory so it applies to every tracker
+    process, but it can only be handed to a process when it is created (e.g.
+    as a `Pool` initializer argument).
+    """
+
+    def __init__(self, urls, ceiling=0):
+        self.ceiling = ceiling
+        self.hosts = sorted({urlparse(url).netloc for url in urls})
+        self.indices = {host: i for i, host in enumerate(self.hosts)}
+        num_hosts = len(self.hosts)
+
+        self.lock = mp.Lock()
+        self.limits = mp.RawArray(ctypes.c_double, [math.inf] * num_hosts)
+        self.next_request = mp.RawArray(ctypes.c_double, num_hosts)
+        self.blocked_until = mp.RawArray(ctypes.c_double, num_hosts)
+        self.last_request = mp.RawArray(ctypes.c_double, num_hosts)
+        # NaN until the first interval has been observed
+        self.avg_interval = mp.RawArray(ctypes.c_double, [math.nan] * num_hosts)
+        self.last_decrease = mp.RawArray(ctypes.c_double, num_hosts)
+        self.last_increase = mp.RawArray(ctypes.c_double, num_hosts)
+        self.next_global_request = mp.RawValue(ctypes.c_double, 0)
+
+    def _host(self, url):
+        return self.indices.get(urlparse(url).netloc)
+
+    def _observed_rate(self, i):
+        """Requests per second made to the host (None if there haven't been enough)."""
+        interval = self.avg_interval[i]
+        if math.isnan(interval):
+            return None
+        return 1 / interval if interval else math.inf
+
+    def acquire(self, url):
+        """Reserve a time to make a request and return how long to wait for it."""
+        i = self._host(url)
+        if i is None and not self.ceiling:
+            return 0
+
+        with self.lock:
+            now = time.time()
+            slot = now
+
+            if self.ceiling:
+                slot = max(slot, self.next_global_request.value)
+            if i is not None:
+                slot = max(slot, self.next_request[i], self.blocked_until[i])
+
+            if self.ceiling:
+                self.next_global_request.value = slot + 1 / self.ceiling
+            if i is not None:
+                self.next_request[i] = slot + 1 / self.limits[i]
+
+                # The wait after being told to back off isn't part of the rate
+                if self.last_request[i] and slot != self.blocked_until[i]:
+                    interval = slot - self.last_request[i]
+                    if math.isnan(self.avg_interval[i]):
+                        self.avg_interval[i] = interval
+                    else:
+                        self.avg_interval[i] += _SMOOTHING * (
+                            interval - self.avg_interval[i]
+                        )
+                self.last_request[i] = slot
+
+        return slot - now
+
+    def throttle(self, url, status, headers):
+        """Slow down if the response asks us to.
+
+        Returns True if the response was a throttling response.
+        """
+        i = self._host(url)
+        if i is None or status not in THROTTLE_STATUSES:
+            return False
+
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+
+        with self.lock:
+            now = time.time()
+            self.blocked_until[i] = max(self.blocked_until[i], now + retry_after)
+
+            # Requests that were already sent will also be throttled,
+            # so only back off once for every round of requests
+            # Without an observed rate there is nothing to halve yet
+            # (e.g. the first response was throttled) so only Retry-After applies
+            rate = self._observed_rate(i)
+            if now - self.last_decrease[i] >= 1 and rate is not None:
+                limit = min(self.limits[i], rate)
+                self.limits[i] = max(MIN_RATE, limit * DECREASE_FACTOR)
+                self.last_decrease[i] = now
+
+        return True
+
+    def success(self, url):
+        """Ramp the rate back up after a successful request."""
+        i = self._host(url)
+
+        # Avoid taking the lock while the host is unlimited
+        if i is None or math.isinf(self.limits[i]):
+            return
+
+        with self.lock:
+            now = time.time()
+            if now - max(self.last_decrease[i], self.last_increase[i]) < 1:
+                return
+
+            self.limits[i] += INCREASE_STEP
+            self.last_increase[i] = now
+
+            # Lift the limit once it no longer holds the trackers back
+            limit = self.limits[i]
+            rate = self._observed_rate(i)
+            if (self.ceiling and limit >= self.ceiling) or (
+                rate is not None and limit > 2 * rate
+            ):
+                self.limits[i] = math.inf
@@ -1,17 +1,16 @@
+import atexit
 import builtins
 import os
 import signal
 import sys
 import time
+from concurrent.futures import as_completed
 from multiprocessing import Pool
-from multiprocessing.managers import BaseManager
 from multiprocessing.pool import ThreadPool
-from threading import Event, Lock
+from threading import Event, Thread, local
 
 import psutil
-from bs4 import BeautifulSoup
 from requests import Session
-from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 from requests.packages.urllib3.util.retry import Retry
 from selenium.common.exceptions import TimeoutException
@@ -20,16 +19,41 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
 from best_buy_bullet_bot.audio import sound_effects
-from best_buy_bullet_bot.browser import purchase
+from best_buy_bullet_bot.browser import get_driver_path, purchase
+from best_buy_bullet_bot.cassette import Cassette, make_adapter
 from best_buy_bullet_bot.data import user_data
 from best_buy_bullet_bot.data.setting_utils import (
+    BROWSER_DETECTOR_NAMES,
     DRIVER_NAMES,
+    ENGINES,
     SOUND_MODES,
     MoneyManager,
     get_settings,
 )
 from best_buy_bullet_bot.data.url_utils import QtyManager
+from best_buy_bullet_bot.detection import fetch_page
+from best_buy_bullet_bot.funds import journal_path, recover_funds
+from best_buy_bullet_bot.rate_control import RateController
+from best_buy_bullet_bot.tracker.dom_detection import (
+    BUTTON_SELECTOR,
+    MARK_CHECKED_SCRIPT,
+    wait_for_button_state,
+)
+from best_buy_bullet_bot.tracker.metrics import MetricsRecorder, start_exporter
+from best_buy_bullet_bot.tracker.outage import (
+    OutageMonitor,
+    probe_driver,
+    probe_session,
+)
 from best_buy_bullet_bot.tracker.progress_bar import IndefeniteProgressBar
+from best_buy_bullet_bot.tracker.scheduler import PollScheduler
+from best_buy_bullet_bot.tracker.shared_state import (
+    SharedPause,
+    SharedProgress,
+    SharedQty,
+    SharedState,
+)
+from best_buy_bullet_bot.tracker.workers import Shards, default_workers
 from best_buy_bullet_bot.utils import Colors
 
 WINDOWS = sys.platform == "win32"
@@ -39,87 +63,93 @@ AUTO_CHECKOUT = SETTINGS["auto checkout"]
 BROWSER_NAME = SETTINGS["browser"]
 DRIVER_WRAPPER = DRIVER_NAMES[BROWSER_NAME]
 NUM_THREADS = SETTINGS["threads"]
+NUM_WORKERS = SETTINGS["workers"]
+ENGINE = SETTINGS["engine"]
+DETECTOR = SETTINGS["detector"]
+BROWSER_DETECTOR = SETTINGS["browser detector"]
+POLL_INTERVAL = SETTINGS["poll interval"]
+BROWSER_POOL_SIZE = SETTINGS["browser pool"]
+METRICS_PORT = SETTINGS["metrics port"]
+METRICS_FILE = SETTINGS["metrics file"]
+MAX_RPS = SETTINGS["max requests per second"]
 
+# In hybrid mode availability is tracked with get requests and a
+# browser is only launched for checkout once the item is in stock
+HYBRID_MODE = AUTO_CHECKOUT and SETTINGS["hybrid mode"]
+BROWSER_TRACKING = AUTO_CHECKOUT and not HYBRID_MODE
 
-class TwoWayPause:
-    def __init__(self):
-        self.play = Event()
-        self.play.set()
-        self.pause = Event()
-
-    def is_set(self):
-        return self.pause.is_set()
-
-    def set(self):
-        self.play.clear()
-        self.pause.set()
-
-    def clear(self):
-        self.pause.clear()
-        self.play.set()
-
-    def wait(self):
-        self.pause.wait()
 
-    def wait_inverse(self):
-        self.play.wait()
+# How long a browser tracker waits for a product page to load
+PAGE_TIMEOUT = 120
 
+# How often trackers check if they have been stopped
+STOP_CHECK_INTERVAL = 1
 
-# The following two classes are needed to use magic methods with `BaseManager`
-class NoMagicLock:
-    def __init__(self):
-        self.lock = Lock()
-
-    def enter(self, *args, **kwargs):
-        self.lock.__enter__(*args, **kwargs)
+# How often workers check for URLs that were given to or taken from them
+WORKER_POLL_INTERVAL = 0.5
 
-    def exit(self, *args, **kwargs):
-        self.lock.__exit__(*args, **kwargs)
+# How often the main process checks if URLs should be moved between workers
+REBALANCE_INTERVAL = 5
 
+# Set in each worker process by `init_worker`
+STATE = None
+BROWSER_POOL = None
+RATE_CONTROLLER = None
+SHARDS = None
+CASSETTE = None
 
-class NormalLock:
-    def __init__(self, no_magic_lock):
-        self.lock = no_magic_lock
+# Trackers that share a worker process each print to their own progress bar
+_PRINT = builtins.print
+_SINKS = local()
 
-    def __enter__(self, *args, **kwargs):
-        self.lock.enter(*args, **kwargs)
 
-    def __exit__(self, *args, **kwargs):
-        self.lock.exit(*args, **kwargs)
+def _print(*args, **kwargs):
+    getattr(_SINKS, "print", _PRINT)(*args, **kwargs)
 
 
-BaseManager.register("ThreadLock", NoMagicLock)
-BaseManager.register("QtyManager", QtyManager)
-BaseManager.register("IndefeniteProgressBar", IndefeniteProgressBar)
-BaseManager.register("PauseEvent", TwoWayPause)
-BaseManager.register("MoneyManager", MoneyManager)
+class Stock:
+    """Hands an item that is in stock from the trackers of a URL to its checkout.
 
+    `value` is False until the item is found, then True or the
+    `(headless_driver, headless_wait)` to check out with.
+    """
 
-STOCK = False
+    def __init__(self):
+        self.value = False
 
 
 def track(
     title,
     url,
-    qty,
+    index,
+    group,
     headless,
+    standby,
     login_cookies,
     password,
     cvv,
-    thread_lock,
-    paused,
-    pbar,
     pred_price,
-    money_manager,
     headers,
+    stopped,
 ):
-    builtins.print = pbar.print
-    if not AUTO_CHECKOUT:
-        headers["referer"] = url
-
-    thread_lock = NormalLock(thread_lock)
-
-    with ThreadPool(NUM_THREADS) as pool:
+    # Everything shared between trackers is read straight from shared memory
+    qty = SharedQty(STATE, group)
+    paused = SharedPause(STATE)
+    pbar = SharedProgress(STATE, index)
+    metrics = MetricsRecorder(STATE.metrics, index)
+    scheduler = PollScheduler(title, NUM_THREADS, metrics)
+    outage = OutageMonitor()
+    money_manager = STATE.ledger
+    thread_lock = STATE.lock
+    stock = Stock()
+
+    _SINKS.print = pbar.print
+    if not BROWSER_TRACKING:
+        # Other URLs tracked by this worker share the same headers
+        headers = {**headers, "referer": url}
+
+    pool = ThreadPool(NUM_THREADS)
+    try:
         pool.starmap_async(
             run,
             [
@@ -131,6 +161,11 @@ def track(
                     thread_lock,
                     paused,
                     pbar,
+                    metrics,
+                    scheduler,
+                    outage,
+                    stock,
+                    stopped,
                     pred_price,
                     money_manager,
                     headers,
@@ -144,13 +179,25 @@ def track(
             url,
             qty,
             headless,
+            standby,
             login_cookies,
             password,
             cvv,
             paused,
+            stock,
+            stopped,
             pred_price,
             money_manager,
         )
+    finally:
+        # Terminating the pool can't stop the threads so the URL is only
+        # handed back once they have exited (e.g. when it moves to another worker)
+        pool.close()
+        pool.join()
+
+        # Send anything that was printed after the last flush. The tracker may
+        # be started again by another worker so it can't keep flushing.
+        pbar.close()
 
 
 def await_checkout(
@@ -158,20 +205,25 @@ def await_checkout(
     url,
     qty,
     headless,
+    standby,
     login_cookies,
     password,
     cvv,
     paused,
+    stock,
+    stopped,
     pred_price,
     money_manager,
 ):
-    global STOCK
-
-    while True:
-        paused.wait()
+    while not stopped.is_set():
+        if not paused.wait(STOP_CHECK_INTERVAL):
+            continue
 
-        if STOCK:
-            if not money_manager.check_funds(pred_price) or not qty.get():
+        if stock.value:
+            # Funds and quantities only run out during auto checkout
+            if AUTO_CHECKOUT and (
+                not money_manager.check_funds(pred_price) or not qty.get()
+            ):
                 paused.clear()
 
                 if SOUND_MODE == SOUND_MODES[2]:
@@ -200,29 +252,41 @@ def await_checkout(
 
             if AUTO_CHECKOUT:
                 try:
-                    while money_manager.check_funds(pred_price) and qty.get():
-                        if purchase(
-                            url,
-                            login_cookies,
-                            headless,
-                            *STOCK,  # `headless_driver` and `headless_wait`
-                            title,
-                            password,
-                            cvv,
-                            money_manager,
-                        ):
-                            qty.decrement()
-                        else:
+                    while qty.get():
+                        # Hold on to the funds so other checkouts can't spend them
+                        reservation = money_manager.reserve(pred_price)
+                        if reservation is None:
+                            break
+
+                        try:
+                            purchased = purchase(
+                                url,
+                                login_cookies,
+                                headless,
+                                standby,
+                                *stock.value,  # `headless_driver` and `headless_wait`
+                                title,
+                                password,
+                                cvv,
+                                money_manager,
+                                reservation,
+                            )
+                        finally:
+                            # Does nothing if the purchase went through
+                            money_manager.release(reservation)
+
+                        if not purchased:
                             break
+                        qty.decrement()
                 except Exception as e:
                     Colors.print(
                         f"CHECKOUT ERROR: {e}",
                     )
 
-            STOCK = False
+            stock.value = False
             paused.clear()
         else:
-            paused.wait_inverse()
+            paused.wait_inverse(STOP_CHECK_INTERVAL)
 
 
 def run(
@@ -233,47 +297,61 @@ def run(
     thread_lock,
     paused,
     pbar,
+    metrics,
+    scheduler,
+    outage,
+    stock,
+    stopped,
     pred_price,
     money_manager,
     headers,
 ):
-    global STOCK
-
+    _SINKS.print = pbar.print
     stop_tracker = False
 
-    if AUTO_CHECKOUT:
-        options = DRIVER_WRAPPER.options()
-        options.page_load_strategy = "none"
-        options.add_argument("--proxy-server='direct://'")
-        options.add_argument("--proxy-bypass-list=*")
-        options.add_argument("--headless")
-
-        # Suppress "DevTools listening on ws:..." message
-        if BROWSER_NAME == "chrome":
-            options.add_experimental_option("excludeSwitches", ["enable-logging"])
-
-        # Create the browser window
-        driver = DRIVER_WRAPPER.driver(
-            executable_path=DRIVER_WRAPPER.manager().install(), options=options
-        )
+    if BROWSER_TRACKING:
+        if BROWSER_POOL is None:
+            options = DRIVER_WRAPPER.options()
+            options.page_load_strategy = "none"
+            options.add_argument("--proxy-server='direct://'")
+            options.add_argument("--proxy-bypass-list=*")
+            options.add_argument("--headless")
+
+            # Suppress "DevTools listening on ws:..." message
+            if BROWSER_NAME == "chrome":
+                options.add_experimental_option("excludeSwitches", ["enable-logging"])
+
+            # Create the browser window
+            driver = DRIVER_WRAPPER.driver(
+                executable_path=get_driver_path(), options=options
+            )
+        else:
+            # Open a tab in one of the shared browsers
+            driver = BROWSER_POOL.open_tab()
 
         # Login to the browser by setting the cookies
         driver.get(url)
         for cookie in login_cookies:
             driver.add_cookie(cookie)
 
-        wait = WebDriverWait(driver, 120)
+        wait = WebDriverWait(driver, PAGE_TIMEOUT, poll_frequency=POLL_INTERVAL)
         button_locator = EC.presence_of_element_located(
-            (
-                By.CSS_SELECTOR,
-                ".fulfillment-add-to-cart-button > div > div > button",
-            )
+            (By.CSS_SELECTOR, BUTTON_SELECTOR)
         )
 
+        # Tabs in the pool share their browser with other trackers so
+        # they can't block it while waiting for the page to load
+        observe = BROWSER_DETECTOR == BROWSER_DETECTOR_NAMES[0] and BROWSER_POOL is None
+        if observe:
+            driver.set_script_timeout(PAGE_TIMEOUT)
+
         # Confirm that we have a stable connection and that Best Buy hasn't made any
         # changes to their website that would break out locator
         try:
             btn = wait.until(button_locator)
+            if observe:
+                # Lets the detector tell this page apart from the next one
+                driver.execute_script(MARK_CHECKED_SCRIPT)
         except TimeoutException:
             Colors.print(
                 f"Unable to connect to {title}. Closing tracker.",
@@ -283,99 +361,135 @@ def run(
     else:
         session = Session()
         session.headers.update(headers)
+        # Throttling responses are left to the rate controller
         retry = Retry(
             connect=3,
             backoff_factor=0.25,
-            status_forcelist=[429, 500, 502, 503, 504],
+            status_forcelist=[500, 502, 504],
             method_whitelist=["HEAD", "GET", "OPTIONS"],
+            respect_retry_after_header=False,
         )
-        adapter = HTTPAdapter(max_retries=retry)
+        adapter = make_adapter(CASSETTE, max_retries=retry)
         session.mount("https://", adapter)
         session.mount("http://", adapter)
 
-    connection_status = True
     available = False
     prev_available = False
 
     # Track item so long as we have sufficient funds and haven't bought the item too many times
-    while not stop_tracker and (
-        not AUTO_CHECKOUT or (money_manager.check_funds(pred_price) and qty.get())
+    while (
+        not stop_tracker
+        and not stopped.is_set()
+        and (not AUTO_CHECKOUT or (money_manager.check_funds(pred_price) and qty.get()))
     ):
         # Stop trackers to conserve resources during the auto checkout process
         if paused.is_set():
-            paused.wait_inverse()
+            paused.wait_inverse(STOP_CHECK_INTERVAL)
             continue
 
-        if AUTO_CHECKOUT:
+        # Stop polling until the connection is back
+        if outage.active():
+            outage.wait_for_recovery(
+                (lambda: probe_driver(driver, url))
+                if BROWSER_TRACKING
+                else (lambda: probe_session(session, url))
+            )
+            continue
+
+        # Wait for this thread's turn so checks are evenly spaced
+        time.sleep(scheduler.reserve())
+
+        # Stay within the rate Best Buy is willing to serve
+        time.sleep(RATE_CONTROLLER.acquire(url))
+
+        if BROWSER_TRACKING:
+            start = time.perf_counter()
             driver.get(url)
 
             try:
-                # Wait until old page has unloaded
-                wait.until(EC.staleness_of(btn))
+                if observe:
+                    # Resolves as soon as the button shows up on the new page
+                    button_state = wait_for_button_state(driver, PAGE_TIMEOUT)
+                else:
+                    # Wait until old page has unloaded
+                    wait.until(EC.staleness_of(btn))
 
                 if paused.is_set():
                     # Stop page load (page will reload when tracker restarts)
                     driver.execute_script("window.stop();")
                     continue
 
-                # Wait until the add-to-cart button is present on the new page
-                btn = wait.until(button_locator)
+                if not observe:
+                    # Wait until the add-to-cart button is present on the new page
+                    btn = wait.until(button_locator)
+                    button_state = btn.get_attribute("data-button-state")
 
             # Inform the user if an error occurs while trying to locate the add-to-cart button
             except TimeoutException:
-                if connection_status:
-                    start_time = time.time()
+                metrics.error()
+                if outage.enter():
                     Colors.print(
                         f"{title} tracker has lost connection.\n",
                         properties=["fail"],
                     )
-                    connection_status = False
                 continue
 
+            end = time.perf_counter()
+            metrics.poll(end - start)
+            scheduler.record(start, end)
+
             # Check if it is an add-to-cart button
-            available = btn.get_attribute("data-button-state") == "ADD_TO_CART"
+            available = button_state == "ADD_TO_CART"
 
         else:
+            start = time.perf_counter()
             try:
-                # Make a get request
-                response = session.get(url, timeout=10)
-                response.raise_for_status()
+                # Make a get request and look for the add-to-cart button
+                page = fetch_page(session, url, DETECTOR, timeout=10)
 
             except RequestException as e:
+                # Slow down if Best Buy asks us to
+                response = getattr(e, "response", None)
+                if response is not None and RATE_CONTROLLER.throttle(
+                    url, response.status_code, response.headers
+                ):
+                    metrics.throttled()
+                    continue
+
+                metrics.error()
                 # Inform the user if an error occurs while trying to make a get request
-                if connection_status:
-                    start_time = time.time()
+                if outage.enter():
                     Colors.print(
                         f"Unable to establish a connection to {title} remote endpoint.",
                         properties=["fail"],
                     )
                     print(e, "\n")
-                    connection_status = False
                 continue
 
+            end = time.perf_counter()
+            metrics.poll(end - start - page.parse_time, page.parse_time)
+            scheduler.record(start, end)
+            RATE_CONTROLLER.success(url)
+
             if paused.is_set():
                 continue
 
-            # Look for add-to-cart button
-            soup = BeautifulSoup(response.text, "html.parser")
-            available = (
-                soup.find(
-                    "button",
-                    {"data-button-state": "ADD_TO_CART"},
-                )
-                is not None
-            )
+            available = page.available
 
         pbar.update()
 
         # If we reconnected, inform the user
-        if not connection_status:
+        recovered = outage.resolve()
+        if recovered is not None:
+            downtime, recovery_time = recovered
+            metrics.reconnect(downtime)
             Colors.print(
                 f"{title} tracker has successfully reconnected!",
                 properties=["success"],
             )
-            print(f"Downtime: {time.time()-start_time:.2f} seconds \n")
-            connection_status = True
+            print(
+                f"Downtime: {downtime:.2f} seconds (tracking resumed {recovery_time:.2f} seconds after reconnecting) \n"
+            )
 
         # If the item is in stock
         if available:
@@ -384,11 +498,15 @@ def run(
                 if paused.is_set():
                     continue
 
-                if AUTO_CHECKOUT:
-                    if not STOCK:
-                        STOCK = (driver, wait)
+                if BROWSER_TRACKING:
+                    if not stock.value:
+                        stock.value = (driver, wait)
+                elif HYBRID_MODE:
+                    # Checkout will start from a fresh browser
+                    if not stock.value:
+                        stock.value = (None, None)
                 else:
-                    STOCK = True
+                    stock.value = True
                 paused.set()
 
         # If item went back to being out of stock
@@ -398,12 +516,12 @@ def run(
 
         prev_available = available
 
-    # Stop the auto checkout function
-    if STOCK is not True:
-        STOCK = True
+    # Stop the auto checkout function (unless the tracker is moving to another worker)
+    if not stopped.is_set() and stock.value is not True:
+        stock.value = True
         paused.set()
 
-    if AUTO_CHECKOUT:
+    if BROWSER_TRACKING:
         driver.close()
     else:
         session.close()
@@ -434,7 +552,67 @@ def set_priority(high_priority):
     p.nice(priority)
 
 
-def start(fast=False, headless=False, verify_account=False, skip_verification=False):
+def init_worker(high_priority, state, browser_pool, rate_controller, shards, cassette):
+    global STATE, BROWSER_POOL, RATE_CONTROLLER, SHARDS, CASSETTE
+    STATE = state
+    BROWSER_POOL = browser_pool
+    RATE_CONTROLLER = rate_controller
+    SHARDS = shards
+    CASSETTE = cassette
+    set_priority(high_priority)
+
+    builtins.print = _print
+
+
+def work(worker, tasks):
+    """Track the URLs assigned to this worker until every URL has finished."""
+    process = psutil.Process(os.getpid())
+    running = {}
+
+    while not SHARDS.done():
+        # Titles are filled in as they are looked up by the main process
+        for index, title in SHARDS.receive_titles(worker):
+            tasks[index][0] = title
+
+        for index, task in enumerate(tasks):
+            if (
+                task[0] is not None
+                and index not in running
+                and SHARDS.targets[index] == worker
+                and SHARDS.owners[index] == -1
+                and not SHARDS.finished[index]
+            ):
+                SHARDS.owners[index] = worker
+                stopped = Event()
+                thread = Thread(target=track, args=[*task, stopped], daemon=True)
+                thread.start()
+                running[index] = (thread, stopped)
+
+        for index, (thread, stopped) in list(running.items()):
+            if not thread.is_alive():
+                # Trackers that were stopped will be picked up by another worker
+                if not stopped.is_set():
+                    SHARDS.finished[index] = True
+                SHARDS.owners[index] = -1
+                del running[index]
+
+            # The URL was given to another worker
+            elif SHARDS.targets[index] != worker:
+                stopped.set()
+
+        SHARDS.report(worker, len(running), process)
+        time.sleep(WORKER_POLL_INTERVAL)
+
+
+def start(
+    fast=False,
+    headless=False,
+    verify_account=False,
+    skip_verification=False,
+    record=None,
+    replay=None,
+    replay_speed=1,
+):
     from elevate import elevate
 
     from best_buy_bullet_bot.browser import browser_startup, get_user_agent
@@ -458,9 +636,20 @@ def start(fast=False, headless=False, verify_account=False, skip_verification=Fa
         print("Elevating permissions to run in fast mode.")
         elevate(graphical=False)
 
+    cassette = None
+    ledger = None
+
     def kill_all(*args, **kwargs):
+        # Save what has been recorded so far
+        if cassette is not None:
+            cassette.close()
+
+        # Save the purchases that were made
+        if ledger is not None:
+            ledger.close()
+
         if not WINDOWS:
-            # Delete the temp file
+            # Delete the shared variable store
             close_data()
 
         # Forcefully close everything
@@ -530,45 +719,67 @@ Y88b  d88P 888   d88P      888   d88P Y88..88P Y88b.
     print("Tracking the following URLs.")
     url_utils.view_urls(AUTO_CHECKOUT)
 
-    manager = BaseManager()
-    manager.start()
+    if record is not None or replay is not None:
+        if record is not None and replay is not None:
+            Colors.print(
+                "A cassette can't be recorded and replayed at the same time.",
+                properties=["fail"],
+            )
+            sys.exit(1)
 
-    money_manager = manager.MoneyManager()
-    if AUTO_CHECKOUT:
-        print(f"Current funds: ${money_manager.get_funds():,.2f}")
-    print()
+        if replay is not None:
+            if not os.path.isfile(replay):
+                Colors.print(f"{replay} does not exist.", properties=["fail"])
+                sys.exit(1)
 
-    # Get URLs and a quantity object for each URL
-    urls, qtys = [], []
-    for url_group, raw_qty in raw_urls:
-        int_qty = -1 if raw_qty == "inf" else raw_qty
+            # Responses from the cassette would lead to real orders
+            if AUTO_CHECKOUT:
+                Colors.print(
+                    "Auto checkout must be disabled to replay a cassette.",
+                    "Run `3b-bot toggle-auto-checkout` to disable it.",
+                    properties=["fail"],
+                )
+                sys.exit(1)
 
-        # Create a shared qty manager between URLs for URL groups
-        qty = manager.QtyManager(int_qty) if len(url_group) > 1 else QtyManager(int_qty)
+        elif BROWSER_TRACKING:
+            Colors.warn(
+                "Browser trackers are not recorded, only the title lookups will be saved to the cassette."
+            )
 
-        urls += url_group
-        qtys += [qty] * len(url_group)
+        cassette = Cassette(record or replay, replay is not None, replay_speed)
 
-    with loading("Checking URLs"):
-        titles = list(url_utils.get_url_titles())
+        # Save the recording if we exit without being killed
+        atexit.register(cassette.close)
 
-    if len(titles) < len(urls):
-        sys.exit(1)
-    elif len(titles) > len(urls):
-        Colors.print(
-            "Something went wrong!",
-            "Please report the issue to https://github.com/LeonShams/BestBuyBulletBot/issues.",
-            "Feel free to copy and paste the following when opening an issue.",
-            properties=["fail", "bold"],
+    # The asyncio engine can't hand a browser off to the checkout process
+    use_async = ENGINE == ENGINES[1] and not AUTO_CHECKOUT and cassette is None
+    if ENGINE == ENGINES[1] and AUTO_CHECKOUT:
+        Colors.warn(
+            f"The {ENGINES[1]} engine is only used when auto checkout is disabled. Falling back to {ENGINES[0]}."
         )
-        print(
-            "ERROR ENCOUNTERED DURING EXECUTION: More titles than URLs!",
-            f"Raw URLs: {raw_urls}",
-            f"URLs: {urls}",
-            f"Titles: {titles}",
-            sep="\n",
+    elif ENGINE == ENGINES[1] and cassette is not None:
+        Colors.warn(
+            f"The {ENGINES[1]} engine can't record or replay cassettes. Falling back to {ENGINES[0]}."
         )
-        sys.exit(1)
+
+    # Apply purchases that weren't saved when the bot last stopped
+    recover_funds()
+    money_manager = MoneyManager()
+    browser_pool = None
+    if AUTO_CHECKOUT:
+        print(f"Current funds: ${money_manager.get_funds():,.2f}")
+    print()
+
+    # Get URLs and the quantity for each URL group
+    urls, groups, group_qtys = [], [], []
+    for group, (url_group, raw_qty) in enumerate(raw_urls):
+        group_qtys.append(-1 if raw_qty == "inf" else raw_qty)
+        urls += url_group
+        groups += [group] * len(url_group)
+
+    # Look up the titles in the background while we log in
+    # Cassettes need every page to come from Best Buy rather than the cache
+    lookups = url_utils.lookup_urls(urls, use_cache=cassette is None, cassette=cassette)
 
     if AUTO_CHECKOUT:
         email, password, cvv = user_data.get_creds()
@@ -583,14 +794,23 @@ Y88b  d88P 888   d88P      888   d88P Y88..88P Y88b.
                     email, password, cvv = user_data.get_creds()
 
         print()
-        login_cookies_list, predicted_prices = browser_startup(
+        login_cookies_list, predicted_prices, standby = browser_startup(
             headless, email, password, urls, verify_account, skip_verification
         )
-        headers = {}
+
+        if BROWSER_POOL_SIZE and not HYBRID_MODE:
+            from best_buy_bullet_bot.browser_pool import BrowserPool
+
+            browser_pool = BrowserPool(BROWSER_POOL_SIZE)
+            browser_pool.report_when_ready(len(urls) * NUM_THREADS)
     else:
         email, password, cvv = "", "", ""
+        standby = None
         login_cookies_list, predicted_prices = ((None for _ in urls) for i in range(2))
 
+    if BROWSER_TRACKING:
+        headers = {}
+    else:
         headers = {
             "accept": "*/*",
             "accept-encoding": "gzip, deflate, br",
@@ -607,36 +827,148 @@ Y88b  d88P 888   d88P      888   d88P Y88..88P Y88b.
         Colors.print("Fast tracking enabled!", properties=["blue"])
     print()
 
-    # Create remaining shared objects
-    thread_lock = manager.ThreadLock()
-    paused = manager.PauseEvent()
-    pbar = manager.IndefeniteProgressBar()
+    if use_async:
+        from best_buy_bullet_bot.tracker.async_engine import track_all
+        from best_buy_bullet_bot.tracker.metrics import create_metrics
 
-    # Start process for each URL
-    with Pool(len(urls), set_priority, [fast]) as p:
-        p.starmap(
-            track,
-            [
-                [
-                    title,
-                    url,
-                    qty,
-                    headless,
-                    login_cookies,
-                    password,
-                    cvv,
-                    thread_lock,
-                    paused,
-                    pbar,
-                    pred_price,
-                    money_manager,
-                    headers,
-                ]
-                for title, url, qty, login_cookies, pred_price in zip(
-                    titles, urls, qtys, login_cookies_list, predicted_prices
-                )
-            ],
+        # URLs in a group share a quantity
+        qtys = [QtyManager(qty) for qty in group_qtys]
+        qtys = [qtys[group] for group in groups]
+
+        with loading("Checking URLs"):
+            results = [
+                url_utils.check_lookup(url, lookup)
+                for url, lookup in zip(urls, lookups)
+            ]
+        url_utils.report_failures([error for _, error in results if error is not None])
+
+        # Only track the URLs that could be checked
+        checked = [i for i, (title, _) in enumerate(results) if title is not None]
+        if not checked:
+            sys.exit(1)
+        predicted_prices = list(predicted_prices)
+        titles = [results[i][0] for i in checked]
+        urls, qtys, predicted_prices = (
+            [values[i] for i in checked] for values in (urls, qtys, predicted_prices)
+        )
+
+        metrics = create_metrics(len(urls))
+        exporter = start_exporter(metrics, titles, urls, METRICS_PORT, METRICS_FILE)
+
+        track_all(
+            titles,
+            urls,
+            qtys,
+            predicted_prices,
+            money_manager,
+            headers,
+            metrics,
+            RateController(urls, MAX_RPS),
+        )
+        if exporter is not None:
+            exporter.close()
+        print("\nAll trackers have finished.")
+        return
+
+    # Split the URLs between a fixed number of worker processes
+    num_workers = min(NUM_WORKERS or default_workers(), len(urls))
+    shards = Shards(groups, num_workers)
+    print(
+        f"Tracking {len(urls)} URL{'s' if len(urls) > 1 else ''} with {num_workers} worker process{'es' if num_workers > 1 else ''}.\n"
+    )
+
+    # Titles are filled in as they are looked up so each URL
+    # can start being tracked without waiting for the others
+    titles = [None] * len(urls)
+
+    # Create the state that is shared between all trackers
+    state = SharedState(
+        money_manager.get_funds(),
+        group_qtys,
+        len(urls),
+        journal_path() if AUTO_CHECKOUT else None,
+    )
+    ledger = state.ledger
+    exporter = start_exporter(
+        state.metrics, titles, urls, METRICS_PORT, METRICS_FILE, shards
+    )
+    pbar = IndefeniteProgressBar()
+    state.attach_progress_bar(pbar)
+
+    rate_controller = RateController(urls, MAX_RPS)
+
+    def publish_titles():
+        errors = []
+        indices = {lookup: index for index, lookup in enumerate(lookups)}
+        for lookup in as_completed(lookups):
+            index = indices[lookup]
+            title, error = url_utils.check_lookup(urls[index], lookup)
+            if title is None:
+                errors.append((index, error))
+                shards.discard(index)
+            else:
+                titles[index] = title
+                shards.publish_title(index, title)
+        url_utils.report_failures([error for _, error in sorted(errors)])
+
+    tasks = [
+        [
+            title,
+            url,
+            index,
+            group,
+            headless,
+            standby,
+            login_cookies,
+            password,
+            cvv,
+            pred_price,
+            headers,
+        ]
+        for index, (title, url, group, login_cookies, pred_price) in enumerate(
+            zip(titles, urls, groups, login_cookies_list, predicted_prices)
         )
+    ]
+
+    with Pool(
+        num_workers,
+        init_worker,
+        [fast, state, browser_pool, rate_controller, shards, cassette],
+    ) as p:
+        result = p.starmap_async(
+            work, [[worker, tasks] for worker in range(num_workers)]
+        )
+        publisher = Thread(target=publish_titles, daemon=True)
+        publisher.start()
+
+        # Move URLs off of busy workers as other workers run out of URLs
+        while not result.ready():
+            result.wait(REBALANCE_INTERVAL)
+            if state.paused.value:
+                continue
+
+            moved = shards.rebalance()
+            if moved is not None:
+                index, busiest, idlest = moved
+                print(
+                    f'Moving "{titles[index]}" from worker {busiest + 1} to worker {idlest + 1}.\n'
+                )
+
+        # Raise any errors from the workers
+        result.get()
+    publisher.join()
+
+    if browser_pool is not None:
+        browser_pool.close()
+    if exporter is not None:
+        exporter.close()
+    state.ledger.close()
 
     pbar.close()
+    if cassette is not None and not cassette.replay:
+        print(f"\nRecorded {cassette.close():,} requests to {record}.")
+
+    # None of the URLs could be checked
+    if not any(titles):
+        sys.exit(1)
     print("\nAll processes have finished.")
@@ -0,0 +1,326 @@
+import asyncio
+import time
+
+import aiohttp
+
+from best_buy_bullet_bot.audio import sound_effects
+from best_buy_bullet_bot.data.setting_utils import SOUND_MODES, get_settings
+from best_buy_bullet_bot.detection import CHUNK_SIZE, DETECTORS
+from best_buy_bullet_bot.tracker.metrics import MetricsRecorder
+from best_buy_bullet_bot.tracker.outage import AsyncOutageMonitor
+from best_buy_bullet_bot.tracker.progress_bar import IndefeniteProgressBar
+from best_buy_bullet_bot.tracker.scheduler import PollScheduler
+from best_buy_bullet_bot.utils import Colors
+
+SETTINGS = get_settings()
+SOUND_MODE = SETTINGS["sound mode"]
+NUM_THREADS = SETTINGS["threads"]
+DETECTOR = SETTINGS["detector"]
+
+
+class AsyncTwoWayPause:
+    """Event loop equivalent of `TwoWayPause`."""
+
+    def __init__(self):
+        self.play = asyncio.Event()
+        self.play.set()
+        self.pause = asyncio.Event()
+
+    def is_set(self):
+        return self.pause.is_set()
+
+    def set(self):
+        self.play.clear()
+        self.pause.set()
+
+    def clear(self):
+        self.pause.clear()
+        self.play.set()
+
+    async def wait(self):
+        await self.pause.wait()
+
+    async def wait_inverse(self):
+        await self.play.wait()
+
+
+async def fetch_page(session, url, **kwargs):
+    """Event loop equivalent of `detection.fetch_page`."""
+    scanner = DETECTORS[DETECTOR]()
+    parse_time = 0
+
+    # Leaving the context manager early closes the connection
+    async with session.get(url, **kwargs) as response:
+        response.raise_for_status()
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            start = time.perf_counter()
+            done = scanner.feed(chunk)
+            parse_time += time.perf_counter() - start
+            if done:
+                break
+
+    start = time.perf_counter()
+    page = scanner.result()
+    return page._replace(parse_time=parse_time + time.perf_counter() - start)
+
+
+class URLTracker:
+    """Tracks a single URL with `NUM_THREADS` polling coroutines.
+
+    Each `URLTracker` plays the role of a tracker process from the
+    multiprocessing engine, so `stock` replaces the per-process `STOCK`.
+    """
+
+    def __init__(
+        self,
+        title,
+        url,
+        qty,
+        pred_price,
+        money_manager,
+        paused,
+        lock,
+        pbar,
+        metrics,
+        rate_controller,
+    ):
+        self.title = title
+        self.url = url
+        self.qty = qty
+        self.pred_price = pred_price
+        self.money_manager = money_manager
+        self.paused = paused
+        self.lock = lock
+        self.pbar = pbar
+        self.metrics = metrics
+        self.rate_controller = rate_controller
+        self.scheduler = PollScheduler(title, NUM_THREADS, metrics)
+        self.outage = AsyncOutageMonitor()
+        self.stock = False
+
+    def trackable(self):
+        # Predicted prices are only available if auto checkout is enabled
+        return (
+            self.pred_price is None or self.money_manager.check_funds(self.pred_price)
+        ) and self.qty.get()
+
+    async def track(self, session):
+        pollers = [asyncio.ensure_future(self.run(session)) for _ in range(NUM_THREADS)]
+
+        try:
+            await self.await_checkout()
+        finally:
+            for poller in pollers:
+                poller.cancel()
+            await asyncio.gather(*pollers, return_exceptions=True)
+
+    async def await_checkout(self):
+        while True:
+            await self.paused.wait()
+
+            if self.stock:
+                if not self.trackable():
+                    self.paused.clear()
+
+                    if SOUND_MODE == SOUND_MODES[2]:
+                        sound_effects.stop()
+
+                    Colors.print(
+                        f'All requested "{self.title}" were purchased.'
+                        if self.pred_price is None
+                        or self.money_manager.check_funds(self.pred_price)
+                        else f"With only ${self.money_manager.get_funds():,.2f} you cannot afford {self.title}.",
+                        "It will no longer be tracked to conserve resources.\n",
+                        properties=["warning"],
+                    )
+                    return
+
+                current_time = time.strftime("%H:%M:%S", time.localtime())
+                Colors.print(
+                    f'\n{current_time} - "{self.title}" - {self.url}\n',
+                    properties=["bold"],
+                )
+
+                # Plays a sound
+                if SOUND_MODE == SOUND_MODES[1]:
+                    sound_effects.play()
+                elif SOUND_MODE == SOUND_MODES[2]:
+                    sound_effects.start()
+
+                self.stock = False
+                self.paused.clear()
+            else:
+                await self.paused.wait_inverse()
+
+    async def probe(self, session):
+        """Event loop equivalent of `outage.probe_session`."""
+        try:
+            async with session.head(
+                self.url, timeout=aiohttp.ClientTimeout(total=5)
+            ) as response:
+                return response.status < 500
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+    async def run(self, session):
+        available = False
+        prev_available = False
+
+        while self.trackable():
+            if self.paused.is_set():
+                await self.paused.wait_inverse()
+                continue
+
+            # Stop polling until the connection is back
+            if self.outage.active():
+                await self.outage.wait_for_recovery(lambda: self.probe(session))
+                continue
+
+            # Wait for this coroutine's turn so checks are evenly spaced
+            await asyncio.sleep(self.scheduler.reserve())
+
+            # Stay within the rate Best Buy is willing to serve
+            await asyncio.sleep(self.rate_controller.acquire(self.url))
+
+            start = time.perf_counter()
+            try:
+                # Make a get request and look for the add-to-cart button
+                page = await fetch_page(
+                    session, self.url, headers={"referer": self.url}
+                )
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Slow down if Best Buy asks us to
+                if isinstance(
+                    e, aiohttp.ClientResponseError
+                ) and self.rate_controller.throttle(
+                    self.url, e.status, e.headers or {}
+                ):
+                    self.metrics.throttled()
+                    continue
+
+                self.metrics.error()
+                # Inform the user if an error occurs while trying to make a get request
+                if self.outage.enter():
+                    Colors.print(
+                        f"Unable to establish a connection to {self.title} remote endpoint.",
+                        properties=["fail"],
+                    )
+                    print(e, "\n")
+                continue
+
+            end = time.perf_counter()
+            self.metrics.poll(end - start - page.parse_time, page.parse_time)
+            self.scheduler.record(start, end)
+            self.rate_controller.success(self.url)
+
+            if self.paused.is_set():
+                continue
+
+            available = page.available
+
+            self.pbar.update()
+
+            # If we reconnected, inform the user
+            recovered = self.outage.resolve()
+            if recovered is not None:
+                downtime, recovery_time = recovered
+                self.metrics.reconnect(downtime)
+                Colors.print(
+                    f"{self.title} tracker has successfully reconnected!",
+                    properties=["success"],
+                )
+                print(
+                    f"Downtime: {downtime:.2f} seconds (tracking resumed {recovery_time:.2f} seconds after reconnecting) \n"
+                )
+
+            # If the item is in stock
+            if available:
+                async with self.lock:
+                    if self.paused.is_set():
+                        continue
+
+                    self.stock = True
+                    self.paused.set()
+
+            # If item went back to being out of stock
+            elif prev_available != available:
+                if SOUND_MODE == SOUND_MODES[2]:
+                    sound_effects.stop()
+
+            prev_available = available
+
+        # Stop the checkout coroutine
+        self.stock = True
+        self.paused.set()
+
+
+async def _track_all(
+    titles,
+    urls,
+    qtys,
+    predicted_prices,
+    money_manager,
+    headers,
+    metrics,
+    rate_controller,
+):
+    # Shared between all URLs just like in the multiprocessing engine
+    paused = AsyncTwoWayPause()
+    lock = asyncio.Lock()
+    pbar = IndefeniteProgressBar()
+
+    # A single connection pool is shared by every tracker
+    connector = aiohttp.TCPConnector(limit=len(urls) * NUM_THREADS, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=10)
+
+    try:
+        async with aiohttp.ClientSession(
+            headers=headers, connector=connector, timeout=timeout
+        ) as session:
+            await asyncio.gather(
+                *[
+                    URLTracker(
+                        title,
+                        url,
+                        qty,
+                        pred_price,
+                        money_manager,
+                        paused,
+                        lock,
+                        pbar,
+                        MetricsRecorder(metrics, index),
+                        rate_controller,
+                    ).track(session)
+                    for index, (title, url, qty, pred_price) in enumerate(
+                        zip(titles, urls, qtys, predicted_prices)
+                    )
+                ]
+            )
+    finally:
+        pbar.close()
+
+
+def track_all(
+    titles,
+    urls,
+    qtys,
+    predicted_prices,
+    money_manager,
+    headers,
+    metrics,
+    rate_controller,
+):
+    """Track every URL from a single event loop."""
+    asyncio.run(
+        _track_all(
+            titles,
+            urls,
+            qtys,
+            predicted_prices,
+            money_manager,
+            headers,
+            metrics,
+            rate_controller,
+        )
+    )
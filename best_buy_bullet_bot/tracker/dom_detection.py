@@ -0,0 +1,92 @@
+import time
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+BUTTON_SELECTOR = ".fulfillment-add-to-cart-button > div > div > button"
+
+# How long to wait for the button after the page has finished loading
+MISSING_GRACE = 2000  # ms
+
+MARK_CHECKED_SCRIPT = "window.__bbbChecked = true;"
+
+# Resolves with the state of the add-to-cart button the moment it appears.
+# The script can end up running on the page we are navigating away from, in
+# which case it asks to be run again once that page has been replaced.
+_WATCH_SCRIPT = """
+const selector = arguments[0];
+const grace = arguments[1];
+const done = arguments[arguments.length - 1];
+
+if (window.__bbbChecked) {
+    window.addEventListener("pagehide", () => done({stale: true}));
+    return;
+}
+
+let finished = false;
+const finish = (state) => {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    window.__bbbChecked = true;
+    done({state: state});
+};
+
+const check = () => {
+    const button = document.querySelector(selector);
+    if (button !== null && button.hasAttribute("data-button-state")) {
+        finish(button.getAttribute("data-button-state"));
+    }
+};
+
+const observer = new MutationObserver(check);
+observer.observe(document, {
+    childList: true,
+    subtree: true,
+    attributes: true,
+    attributeFilter: ["data-button-state"],
+});
+check();
+
+// Give up shortly after the page has loaded without the button
+const onLoad = () => setTimeout(() => finish(null), grace);
+if (document.readyState === "complete") {
+    onLoad();
+} else {
+    window.addEventListener("load", onLoad);
+}
+"""
+
+
+def wait_for_button_state(driver, timeout):
+    """Wait for the page that is loading to show its add-to-cart button.
+
+    Returns the `data-button-state` of the button. Raises a TimeoutException
+    if the button doesn't show up. The script timeout of the driver should be
+    at least `timeout`.
+    """
+    deadline = time.perf_counter() + timeout
+    errors = 0
+
+    while True:
+        try:
+            result = driver.execute_async_script(
+                _WATCH_SCRIPT, BUTTON_SELECTOR, MISSING_GRACE
+            )
+            errors = 0
+        except TimeoutException:
+            raise
+        except WebDriverException:
+            # The old page was unloaded while the script was running on it.
+            # Repeated errors mean something else is wrong so don't spin on them.
+            result = {"stale": True}
+            errors += 1
+            if errors > 1:
+                time.sleep(0.1)
+
+        if result is not None and not result.get("stale"):
+            if result["state"] is None:
+                raise TimeoutException("The add-to-cart button could not be found.")
+            return result["state"]
+
+        if time.perf_counter() > deadline:
+            raise TimeoutException("The page took too long to load.")
@@ -0,0 +1,342 @@
+import ctypes
+import math
+import multiprocessing as mp
+import os
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+from best_buy_bullet_bot.utils import Colors
+
+# Upper bounds (in seconds) of the histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PARSE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+# Layout of the slot each URL gets in the shared metrics array
+_LATENCY = 0
+_LATENCY_SUM = _LATENCY + len(LATENCY_BUCKETS) + 1
+_PARSE = _LATENCY_SUM + 1
+_PARSE_SUM = _PARSE + len(PARSE_BUCKETS) + 1
+_POLLS = _PARSE_SUM + 1
+_ERRORS = _POLLS + 1
+_THROTTLED = _ERRORS + 1
+_RECONNECTS = _THROTTLED + 1
+_DOWNTIME = _RECONNECTS + 1
+_LAST_SUCCESS = _DOWNTIME + 1
+_CHECK_INTERVAL = _LAST_SUCCESS + 1
+SLOT_SIZE = _CHECK_INTERVAL + 1
+
+PREFIX = "bbb"
+
+
+def create_metrics(num_trackers):
+    """Allocate the shared memory used to store the metrics of every URL."""
+    return mp.RawArray(ctypes.c_double, num_trackers * SLOT_SIZE)
+
+
+def poll_counts(metrics):
+    """Number of successful polls of every URL."""
+    return [metrics[offset + _POLLS] for offset in range(0, len(metrics), SLOT_SIZE)]
+
+
+class MetricsRecorder:
+    """Records the metrics of a single URL.
+
+    Only the threads tracking the URL write to its slot and they all live in
+    the same process, so a regular thread lock is enough to keep it consistent.
+    """
+
+    def __init__(self, metrics, index):
+        self.metrics = metrics
+        self.offset = index * SLOT_SIZE
+        self.lock = Lock()
+
+    def _observe(self, start, buckets, value):
+        self.metrics[self.offset + start + bisect_left(buckets, value)] += 1
+        self.metrics[self.offset + start + len(buckets) + 1] += value
+
+    def poll(self, latency, parse_time=None):
+        """Record a successful poll."""
+        with self.lock:
+            self._observe(_LATENCY, LATENCY_BUCKETS, latency)
+            if parse_time is not None:
+                self._observe(_PARSE, PARSE_BUCKETS, parse_time)
+            self.metrics[self.offset + _POLLS] += 1
+            self.metrics[self.offset + _LAST_SUCCESS] = time.time()
+
+    def error(self):
+        with self.lock:
+            self.metrics[self.offset + _ERRORS] += 1
+
+    def throttled(self):
+        with self.lock:
+            self.metrics[self.offset + _THROTTLED] += 1
+
+    def reconnect(self, downtime):
+        with self.lock:
+            self.metrics[self.offset + _RECONNECTS] += 1
+            self.metrics[self.offset + _DOWNTIME] += downtime
+
+    def check_interval(self, seconds):
+        self.metrics[self.offset + _CHECK_INTERVAL] = seconds
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value):
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value))
+
+
+class MetricsExporter:
+    """Exposes the metrics of every URL in the Prometheus text format.
+
+    Metrics can be scraped from a local HTTP endpoint and/or written to a
+    file for the textfile collector of the node exporter. A URL is only
+    exported once its title is known (`titles` may still be filling in).
+    """
+
+    def __init__(self, metrics, titles, urls, shards=None, sample_interval=5):
+        self.metrics = metrics
+        self.shards = shards
+        self.titles = titles
+        self.urls = urls
+        self.sample_interval = sample_interval
+        self.poll_rates = [0.0] * len(urls)
+        self.httpd = None
+
+        Thread(target=self._sample_poll_rates, daemon=True).start()
+
+    def _slot(self, index):
+        return self.metrics[index * SLOT_SIZE : (index + 1) * SLOT_SIZE]
+
+    def _sample_poll_rates(self):
+        prev = [self._slot(i)[_POLLS] for i in range(len(self.urls))]
+        while True:
+            time.sleep(self.sample_interval)
+            for i in range(len(self.urls)):
+                polls = self._slot(i)[_POLLS]
+                self.poll_rates[i] = (polls - prev[i]) / self.sample_interval
+                prev[i] = polls
+
+    def _histogram(self, lines, name, help_text, labels, slots, start, buckets):
+        lines += [
+            f"# HELP {PREFIX}_{name} {help_text}",
+            f"# TYPE {PREFIX}_{name} histogram",
+        ]
+        for label, slot in zip(labels, slots):
+            count = 0
+            for i, bound in enumerate(buckets + (math.inf,)):
+                count += slot[start + i]
+                lines.append(
+                    f'{PREFIX}_{name}_bucket{{{label},le="{_format(bound)}"}} {count:.0f}'
+                )
+            lines += [
+                f"{PREFIX}_{name}_sum{{{label}}} {_format(slot[start + len(buckets) + 1])}",
+                f"{PREFIX}_{name}_count{{{label}}} {count:.0f}",
+            ]
+
+    def _scalar(self, lines, name, metric_type, help_text, labels, values):
+        lines += [
+            f"# HELP {PREFIX}_{name} {help_text}",
+            f"# TYPE {PREFIX}_{name} {metric_type}",
+        ]
+        lines += [
+            f"{PREFIX}_{name}{{{label}}} {_format(value)}"
+            for label, value in zip(labels, values)
+        ]
+
+    def render(self):
+        indices = [i for i, title in enumerate(self.titles) if title is not None]
+        labels = [
+            f'url="{_escape(self.urls[i])}",title="{_escape(self.titles[i])}"'
+            for i in indices
+        ]
+        slots = [self._slot(i) for i in indices]
+        now = time.time()
+
+        lines = []
+        self._histogram(
+            lines,
+            "request_duration_seconds",
+            "Time spent waiting on the product page.",
+            labels,
+            slots,
+            _LATENCY,
+            LATENCY_BUCKETS,
+        )
+        self._histogram(
+            lines,
+            "parse_duration_seconds",
+            "Time spent scanning the product page for the add-to-cart button.",
+            labels,
+            slots,
+            _PARSE,
+            PARSE_BUCKETS,
+        )
+        self._scalar(
+            lines,
+            "polls_total",
+            "counter",
+            "Successful availability checks.",
+            labels,
+            [slot[_POLLS] for slot in slots],
+        )
+        self._scalar(
+            lines,
+            "poll_rate",
+            "gauge",
+            f"Successful availability checks per second over the last {self.sample_interval} seconds.",
+            labels,
+            [self.poll_rates[i] for i in indices],
+        )
+        self._scalar(
+            lines,
+            "check_interval_seconds",
+            "gauge",
+            "Average time between successful availability checks across all threads.",
+            labels,
+            [slot[_CHECK_INTERVAL] for slot in slots],
+        )
+        self._scalar(
+            lines,
+            "errors_total",
+            "counter",
+            "Availability checks that failed.",
+            labels,
+            [slot[_ERRORS] for slot in slots],
+        )
+        self._scalar(
+            lines,
+            "throttled_total",
+            "counter",
+            "Availability checks that Best Buy refused because too many requests were made (429 or 503).",
+            labels,
+            [slot[_THROTTLED] for slot in slots],
+        )
+        self._scalar(
+            lines,
+            "reconnects_total",
+            "counter",
+            "Times the tracker recovered after losing its connection.",
+            labels,
+            [slot[_RECONNECTS] for slot in slots],
+        )
+        self._scalar(
+            lines,
+            "downtime_seconds_total",
+            "counter",
+            "Time spent without a connection before reconnecting.",
+            labels,
+            [slot[_DOWNTIME] for slot in slots],
+        )
+        self._scalar(
+            lines,
+            "seconds_since_last_poll",
+            "gauge",
+            "Time since the last successful availability check.",
+            labels,
+            [
+                now - slot[_LAST_SUCCESS] if slot[_LAST_SUCCESS] else math.inf
+                for slot in slots
+            ],
+        )
+
+        if self.shards is not None:
+            workers = [f'worker="{i + 1}"' for i in range(self.shards.num_workers)]
+            self._scalar(
+                lines,
+                "worker_urls",
+                "gauge",
+                "URLs being tracked by each worker process.",
+                workers,
+                self.shards.trackers,
+            )
+            self._scalar(
+                lines,
+                "worker_cpu_percent",
+                "gauge",
+                "CPU usage of each worker process.",
+                workers,
+                self.shards.cpu,
+            )
+            self._scalar(
+                lines,
+                "worker_memory_bytes",
+                "gauge",
+                "Resident memory of each worker process.",
+                workers,
+                self.shards.memory,
+            )
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port):
+        """Serve the metrics at http://127.0.0.1:<port>/metrics."""
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ["/", "/metrics"]:
+                    self.send_error(404)
+                    return
+
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def write_textfile(self, path, interval=15):
+        """Periodically write the metrics to a file."""
+
+        def write():
+            tmp_path = path + ".tmp"
+            while True:
+                with open(tmp_path, "w") as f:
+                    f.write(self.render())
+
+                # Replacing the file means readers never see a partial write
+                os.replace(tmp_path, path)
+                time.sleep(interval)
+
+        Thread(target=write, daemon=True).start()
+
+    def close(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+
+def start_exporter(metrics, titles, urls, port=0, path="", shards=None):
+    """Start exporting metrics if a port and/or file has been set."""
+    if not (port or path):
+        return None
+
+    exporter = MetricsExporter(metrics, titles, urls, shards)
+
+    if port:
+        try:
+            exporter.serve(port)
+        except OSError as e:
+            Colors.warn(f"Unable to serve metrics on port {port}: {e}")
+        else:
+            print(f"Metrics are available at http://127.0.0.1:{port}/metrics")
+
+    if path:
+        exporter.write_textfile(path)
+        print(f"Metrics are written to {path}")
+
+    return exporter
@@ -0,0 +1,162 @@
+import asyncio
+import time
+from threading import Event, Lock
+
+from requests.exceptions import RequestException
+from selenium.common.exceptions import WebDriverException
+
+# Delay before the first recovery probe and the most we ever wait between probes
+BASE_BACKOFF = 0.5
+MAX_BACKOFF = 30
+
+
+class OutageMonitor:
+    """Keeps track of whether a URL can be reached.
+
+    Once a tracker thread loses its connection the URL enters an outage and
+    the threads tracking it stop polling. One of them checks the connection
+    with a lightweight probe, backing off exponentially between probes, while
+    the others wait. Polling resumes at full speed as soon as a probe succeeds.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.healthy = Event()
+        self.healthy.set()
+
+        self.probing = False
+        self.backoff = BASE_BACKOFF
+        self.outage_start = None
+        self.recovered_at = None
+
+    def active(self):
+        return not self.healthy.is_set()
+
+    def enter(self):
+        """Start an outage (if there isn't one already).
+
+        Returns True if this call started the outage.
+        """
+        with self.lock:
+            self.healthy.clear()
+            self.recovered_at = None
+
+            # The connection might be lost again before anything is polled
+            # in which case the downtime continues from the original outage
+            if self.outage_start is None:
+                self.outage_start = time.time()
+                return True
+            return False
+
+    def _claim_probe(self):
+        with self.lock:
+            if self.probing or not self.active():
+                return None
+            self.probing = True
+            return self.backoff
+
+    def _finish_probe(self, success):
+        with self.lock:
+            self.probing = False
+            if success:
+                self.recovered_at = time.time()
+                self.backoff = BASE_BACKOFF
+                self.healthy.set()
+            else:
+                self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+
+    def wait_for_recovery(self, probe):
+        """Probe the connection or wait for another thread to do it."""
+        if not self.active():
+            return
+
+        delay = self._claim_probe()
+        if delay is None:
+            self.healthy.wait(MAX_BACKOFF)
+            return
+
+        success = False
+        try:
+            time.sleep(delay)
+            success = probe()
+        finally:
+            self._finish_probe(success)
+
+    def resolve(self):
+        """Call after a successful poll.
+
+        Returns the downtime and how long it took to resume polling after
+        the connection came back if this poll ended an outage.
+        """
+        # Avoid taking the lock on every poll
+        if self.outage_start is None:
+            return None
+
+        with self.lock:
+            if self.outage_start is None or self.recovered_at is None:
+                return None
+
+            now = time.time()
+            downtime = self.recovered_at - self.outage_start
+            recovery_time = now - self.recovered_at
+            self.outage_start = self.recovered_at = None
+            return downtime, recovery_time
+
+
+def probe_session(session, url):
+    """Check if the URL can be reached without downloading the page."""
+    try:
+        return session.head(url, timeout=5).status_code < 500
+    except RequestException:
+        return False
+
+
+_PROBE_SCRIPT = """
+const url = arguments[0];
+const done = arguments[arguments.length - 1];
+const controller = new AbortController();
+setTimeout(() => controller.abort(), 5000);
+fetch(url, {method: "HEAD", mode: "no-cors", cache: "no-store", signal: controller.signal})
+    .then(() => done(true), () => done(false));
+"""
+
+
+def probe_driver(driver, url):
+    """Check if the URL can be reached from the browser without loading the page."""
+    try:
+        return bool(driver.execute_async_script(_PROBE_SCRIPT, url))
+    except WebDriverException:
+        return False
+
+
+class AsyncOutageMonitor(OutageMonitor):
+    """Event loop equivalent of `OutageMonitor`."""
+
+    def __init__(self):
+        super().__init__()
+        self.recovered = asyncio.Event()
+
+    def _finish_probe(self, success):
+        super()._finish_probe(success)
+        if success:
+            self.recovered.set()
+            self.recovered.clear()
+
+    async def wait_for_recovery(self, probe):
+        if not self.active():
+            return
+
+        delay = self._claim_probe()
+        if delay is None:
+            try:
+                await asyncio.wait_for(self.recovered.wait(), MAX_BACKOFF)
+            except asyncio.TimeoutError:
+                pass
+            return
+
+        success = False
+        try:
+            await asyncio.sleep(delay)
+            success = await probe()
+        finally:
+            self._finish_probe(success)
@@ -57,5 +57,12 @@ class IndefeniteProgressBar:
         task.completed += 1
         task.times.append(time.time() - self.start_time)
 
+    def sync(self, completed):
+        # Catch up to an iteration count that was tracked elsewhere
+        task = self.pbar.tasks[0]
+        new_iterations = min(completed - task.completed, task.times.maxlen)
+        task.completed = completed
+        task.times.extend([time.time() - self.start_time] * new_iterations)
+
     def close(self):
         self.pbar.stop()
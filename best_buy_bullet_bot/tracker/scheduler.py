@@ -0,0 +1,67 @@
+import time
+from threading import Lock
+
+# Number of checks averaged before the check interval is reported
+REPORT_AFTER = 50
+
+
+class PollScheduler:
+    """Keeps the threads tracking a URL evenly spaced.
+
+    Threads that start together tend to send their requests at the same
+    time, leaving long gaps between checks. Each poll is given a slot
+    `poll_time / threads` after the previous one, so a restock is noticed
+    within about that long no matter when it happens, without making any
+    extra requests.
+    """
+
+    def __init__(self, title, threads, metrics, smoothing=0.2):
+        self.title = title
+        self.threads = threads
+        self.metrics = metrics
+        self.smoothing = smoothing
+
+        self.lock = Lock()
+        self.poll_time = None
+        self.next_slot = 0
+        self.last_check = None
+        self.interval = None
+        self.checks = 0
+
+    def _smooth(self, average, value):
+        if average is None:
+            return value
+        return average + self.smoothing * (value - average)
+
+    def reserve(self):
+        """Reserve the next slot and return how long to wait for it."""
+        with self.lock:
+            if self.poll_time is None or self.threads == 1:
+                return 0
+
+            now = time.perf_counter()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.poll_time / self.threads
+
+            # A thread never waits longer than a poll takes
+            return min(slot - now, self.poll_time)
+
+    def record(self, start, end):
+        """Record a successful poll that started and ended at the given times."""
+        with self.lock:
+            self.poll_time = self._smooth(self.poll_time, end - start)
+
+            if self.last_check is not None:
+                self.interval = self._smooth(
+                    self.interval, max(0, end - self.last_check)
+                )
+            self.last_check = max(end, self.last_check or 0)
+            self.checks += 1
+
+            if self.interval is not None:
+                self.metrics.check_interval(self.interval)
+
+            if self.checks == REPORT_AFTER:
+                print(
+                    f"{self.title} is being checked every {self.interval * 1000:,.0f} ms.\n"
+                )
@@ -0,0 +1,182 @@
+import ctypes
+import multiprocessing as mp
+import queue
+import sys
+import time
+from threading import Event, Lock, Thread
+
+from best_buy_bullet_bot.funds import FundsLedger
+from best_buy_bullet_bot.tracker.metrics import create_metrics
+
+# Batches of prints that can be waiting on the main process before new ones are dropped
+MESSAGE_QUEUE_SIZE = 256
+
+# Prints a tracker process can hold on to between flushes
+MAX_PENDING_PRINTS = 256
+
+# Status messages (e.g. purchases, checkout errors and lost connections) are
+# printed with `Colors.print` which wraps them in escape codes
+_ESCAPE = "\033["
+
+
+class SharedState:
+    """Tracker state that lives in shared memory.
+
+    Trackers read the state without locking or talking to another process,
+    while every write goes through a single cross-process lock. The state
+    can only be handed to a process when it is created (e.g. as a `Pool`
+    initializer argument).
+    """
+
+    def __init__(self, funds, qtys, num_trackers, journal=None):
+        # Reentrant so trackers can pause everything while holding the lock
+        self.lock = mp.RLock()
+
+        self.ledger = FundsLedger(funds, journal)
+        self.qtys = mp.RawArray(ctypes.c_long, qtys)
+
+        self.paused = mp.RawValue(ctypes.c_bool, False)
+        self.pause_event = mp.Event()
+        self.play_event = mp.Event()
+        self.play_event.set()
+
+        # Each tracker only ever writes to its own counters
+        self.iterations = mp.RawArray(ctypes.c_ulonglong, num_trackers)
+        self.dropped = mp.RawArray(ctypes.c_ulonglong, num_trackers)
+        self.messages = mp.Queue(MESSAGE_QUEUE_SIZE)
+        self.metrics = create_metrics(num_trackers)
+
+    def _sync_progress(self, pbar, refresh_rate):
+        reported_drops = 0
+        while True:
+            pbar.sync(sum(self.iterations))
+
+            dropped = sum(self.dropped)
+            if dropped > reported_drops:
+                sys.stdout.write(
+                    f"{dropped - reported_drops} tracker messages were dropped to keep up with tracking.\n"
+                )
+                reported_drops = dropped
+
+            time.sleep(refresh_rate)
+
+    def _relay_messages(self):
+        while True:
+            sys.stdout.write(self.messages.get())
+
+    def attach_progress_bar(self, pbar, refresh_rate=0.1):
+        """Mirror tracker iterations and prints on a progress bar in this process."""
+        for target, args in [
+            (self._sync_progress, (pbar, refresh_rate)),
+            (self._relay_messages, ()),
+        ]:
+            Thread(target=target, args=args, daemon=True).start()
+
+
+class SharedQty:
+    def __init__(self, state, index):
+        self.state = state
+        self.index = index
+
+    def get(self):
+        return self.state.qtys[self.index]
+
+    def decrement(self):
+        with self.state.lock:
+            self.state.qtys[self.index] -= 1
+
+
+class SharedPause:
+    def __init__(self, state):
+        self.state = state
+
+    def is_set(self):
+        return self.state.paused.value
+
+    def set(self):
+        with self.state.lock:
+            self.state.play_event.clear()
+            self.state.paused.value = True
+            self.state.pause_event.set()
+
+    def clear(self):
+        with self.state.lock:
+            self.state.pause_event.clear()
+            self.state.paused.value = False
+            self.state.play_event.set()
+
+    def wait(self, timeout=None):
+        return self.state.pause_event.wait(timeout)
+
+    def wait_inverse(self, timeout=None):
+        return self.state.play_event.wait(timeout)
+
+
+class SharedProgress:
+    """Stands in for the progress bar inside of a tracker process.
+
+    Iterations and prints are collected locally and flushed on a timer, so
+    trackers never wait on the main process. If the main process falls
+    behind, routine prints are dropped (and counted) instead. Status
+    messages are never dropped. Call `close()` once the tracker has stopped.
+    """
+
+    def __init__(self, state, index, flush_interval=0.1):
+        self.state = state
+        self.index = index
+        self.flush_interval = flush_interval
+
+        self.lock = Lock()
+        self.flush_lock = Lock()
+        self.iterations = 0
+        self.lines = []
+        self.important = False
+        self.dropped = 0
+
+        self.stopped = Event()
+        Thread(target=self._flush_periodically, daemon=True).start()
+
+    def print(self, *args, sep=" ", end="\n", **kwargs):
+        msg = sep.join(map(str, args)) + end
+        important = _ESCAPE in msg
+        with self.lock:
+            if important or len(self.lines) < MAX_PENDING_PRINTS:
+                self.lines.append(msg)
+                self.important |= important
+            else:
+                self.dropped += 1
+
+    def update(self):
+        with self.lock:
+            self.iterations += 1
+
+    def flush(self):
+        # Only one flush at a time writes to this tracker's counters
+        with self.flush_lock:
+            with self.lock:
+                iterations, self.iterations = self.iterations, 0
+                lines, self.lines = self.lines, []
+                important, self.important = self.important, False
+                dropped, self.dropped = self.dropped, 0
+
+            self.state.iterations[self.index] += iterations
+
+            if important:
+                # Wait for the main process rather than lose a status message
+                self.state.messages.put("".join(lines))
+            elif lines:
+                try:
+                    self.state.messages.put_nowait("".join(lines))
+                except queue.Full:
+                    dropped += len(lines)
+
+            self.state.dropped[self.index] += dropped
+
+    def close(self):
+        """Stop flushing on a timer and send anything that is left."""
+        self.stopped.set()
+        self.flush()
+
+    def _flush_periodically(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
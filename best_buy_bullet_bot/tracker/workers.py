@@ -0,0 +1,116 @@
+import ctypes
+import math
+import multiprocessing as mp
+import os
+
+import psutil
+
+
+def default_workers():
+    """One worker per physical core."""
+    return psutil.cpu_count(logical=False) or os.cpu_count() or 1
+
+
+class Shards:
+    """Decides which worker process tracks each URL.
+
+    URLs are split between a fixed number of workers, keeping the URLs of a
+    group together where possible. When the URLs of a worker finish (e.g. all
+    of them were bought) URLs are moved over from the busiest worker. A URL is
+    only started by its new worker once the old worker has stopped tracking it.
+
+    URLs can be assigned before their titles are known. Titles are sent to
+    every worker as they come in (any worker may end up tracking a URL) and a
+    URL is only started once its title has arrived.
+
+    Shards live in shared memory and can only be handed to a process when
+    they are created (e.g. as a `Pool` initializer argument).
+    """
+
+    def __init__(self, groups, num_workers):
+        self.num_workers = num_workers
+
+        # Give the largest groups out first so they can be kept together
+        members = {}
+        for index, group in enumerate(groups):
+            members.setdefault(group, []).append(index)
+
+        # Groups that are too large for one worker are split up
+        capacity = math.ceil(len(groups) / num_workers)
+
+        targets = [0] * len(groups)
+        loads = [0] * num_workers
+        for indices in sorted(members.values(), key=len, reverse=True):
+            for index in indices:
+                if index == indices[0] or len(indices) > capacity:
+                    worker = loads.index(min(loads))
+                targets[index] = worker
+                loads[worker] += 1
+
+        # `targets` is only written to by the main process, `owners` by the
+        # worker currently tracking the URL and `finished` by the last worker to track it
+        self.targets = mp.RawArray(ctypes.c_long, targets)
+        self.owners = mp.RawArray(ctypes.c_long, [-1] * len(groups))
+        self.finished = mp.RawArray(ctypes.c_bool, len(groups))
+
+        # Load reported by each worker
+        self.trackers = mp.RawArray(ctypes.c_long, num_workers)
+        self.cpu = mp.RawArray(ctypes.c_double, num_workers)
+        self.memory = mp.RawArray(ctypes.c_double, num_workers)
+
+        # Titles that have been looked up since the workers started
+        self.titles = [mp.SimpleQueue() for _ in range(num_workers)]
+
+    def done(self):
+        return all(self.finished)
+
+    def publish_title(self, index, title):
+        """Let the URL be tracked now that its title is known."""
+        for queue in self.titles:
+            queue.put((index, title))
+
+    def discard(self, index):
+        """Give up on a URL before it was started (e.g. its title lookup failed)."""
+        self.finished[index] = True
+
+    def receive_titles(self, worker):
+        """Yield the `(index, title)` of every URL looked up since the last call."""
+        queue = self.titles[worker]
+        while not queue.empty():
+            yield queue.get()
+
+    def report(self, worker, trackers, process):
+        """Called periodically by each worker to report its load."""
+        self.trackers[worker] = trackers
+        try:
+            self.cpu[worker] = process.cpu_percent()
+            self.memory[worker] = process.memory_info().rss
+        except psutil.Error:
+            pass
+
+    def loads(self):
+        """Number of unfinished URLs assigned to each worker."""
+        loads = [0] * self.num_workers
+        for target, finished in zip(self.targets, self.finished):
+            if not finished:
+                loads[target] += 1
+        return loads
+
+    def rebalance(self):
+        """Move a URL from the busiest worker to the least busy one.
+
+        Returns the index of the URL and the workers it was moved between
+        or None if the workers are already balanced.
+        """
+        loads = self.loads()
+        busiest = loads.index(max(loads))
+        idlest = loads.index(min(loads))
+        if loads[busiest] - loads[idlest] < 2:
+            return None
+
+        for index, (target, owner) in enumerate(zip(self.targets, self.owners)):
+            # Don't move URLs that are still being handed over
+            if target == owner == busiest and not self.finished[index]:
+                self.targets[index] = idlest
+                return index, busiest, idlest
+        return None